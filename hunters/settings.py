@@ -47,9 +47,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'store.utils.perf.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'store.utils.perf.TimedSessionMiddleware',
+    'store.utils.cart.CartMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -61,7 +63,8 @@ ROOT_URLCONF = 'hunters.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to store.utils.perf
+        'BACKEND': 'store.utils.perf.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],   # <= ADD THIS
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,11 +84,65 @@ WSGI_APPLICATION = 'hunters.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite by default, tuned for a web server: WAL lets readers run alongside
+# the writer, busy_timeout/`timeout` make writers queue instead of failing
+# with "database is locked", and IMMEDIATE transactions take the write lock
+# up front so two transactions can never deadlock upgrading from a read.
+# Set DB_ENGINE (and DB_NAME/USER/PASSWORD/HOST/PORT) to use a server
+# database instead; checkout retries transient lock errors on either
+# (see store.utils.db).
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+# hunters.asgi sets SERVER_INTERFACE=asgi. Under ASGI, async views run
+# their queries in sync_to_async threads and Django's per-request cleanup
+# never sees those connections, so persistent connections would pile up;
+# Django's docs say to leave them off there. DB_CONN_MAX_AGE overrides both.
+SERVER_INTERFACE = os.environ.get('SERVER_INTERFACE', 'wsgi')
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'cache_size': -20000,  # KiB
+    'temp_store': 'MEMORY',
+    'mmap_size': 128 * 1024 * 1024,
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0 if SERVER_INTERFACE == 'asgi' else 600)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
     }
+else:
+    DATABASES['default'].update({
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+    })
+
+# Attempts and first back-off delay (seconds, doubled each time) for
+# transactions retried on transient lock errors.
+DB_RETRY_ATTEMPTS = 4
+DB_RETRY_DELAY = 0.05
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared by every worker process, so it can hold carts
+    'carts': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CART_CACHE_DIR', BASE_DIR / '.cache' / 'carts'),
+    },
 }
 
 
@@ -129,6 +186,15 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static', 
 ]
 
+# collectstatic minifies CSS/JS, adds content hashes and writes .gz copies;
+# with SERVE_STATIC the app serves them itself (see store.utils.staticfiles)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'store.utils.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+STATIC_MINIFY = True
+SERVE_STATIC = os.environ.get('SERVE_STATIC', 'true').lower() in ('1', 'true', 'yes')
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -141,9 +207,11 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
-    'DEFAULT_RENDER_CLASSES': [
+    'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'store.pagination.CatalogCursorPagination',
+    'PAGE_SIZE': 24,
 }
 
 # Security settings for production
@@ -152,4 +220,51 @@ SECURE_CONTENT_TYPE_NOSNIFF = True
 X_FRAME_OPTIONS = 'DENY'
 SECURE_HSTS_SECONDS = 31536000 if not DEBUG else 0
 SECURE_HSTS_INCLUDE_SUBDOMAINS = True
-SECURE_HSTS_PRELOAD = True
\ No newline at end of file
+SECURE_HSTS_PRELOAD = True
+
+# Order numbers are handed out from the OrderNumberCounter row. A block size
+# above 1 lets each worker reserve numbers in batches (unique and increasing
+# per worker, with possible gaps after a restart).
+ORDER_NUMBER_BLOCK_SIZE = int(os.environ.get('ORDER_NUMBER_BLOCK_SIZE', 1))
+
+# Where shopping carts are kept: 'session' (the database session), 'cache'
+# (the CART_CACHE_ALIAS cache, keyed by a cookie) or 'cookie' (a signed cookie).
+CART_STORAGE = os.environ.get('CART_STORAGE', 'session')
+CART_CACHE_ALIAS = 'carts'
+CART_COOKIE_AGE = 60 * 60 * 24 * 14
+
+# Seconds before a worker reloads its in-process stock index; changes made
+# by the same worker are applied immediately.
+STOCK_INDEX_TTL = 30
+
+# Product cards rendered per storefront section; further cards are fetched
+# in pages of the same size as the carousel scrolls.
+CATALOG_SECTION_SIZE = 12
+SEARCH_INDEX_TTL = 30
+
+# Seconds a cart holds the stock it contains (0 disables holds). Expired
+# holds are released by `manage.py release_expired_holds` and by an
+# opportunistic sweep, at most every CART_HOLD_SWEEP_INTERVAL seconds.
+CART_HOLD_TTL = 15 * 60
+CART_HOLD_SWEEP_INTERVAL = 60
+
+# Widths (px) of the WebP/JPEG copies generated for product images, and
+# whether they are generated as soon as a product image is saved (otherwise
+# run `manage.py build_image_variants`).
+PRODUCT_IMAGE_WIDTHS = (320, 480, 680)
+PRODUCT_IMAGE_VARIANTS_ON_SAVE = True
+
+# Request instrumentation (store.utils.perf): every request is timed per
+# route; PERF_SAMPLE_RATE of them also measure SQL, template and session
+# time. Requests over either threshold are logged (0 disables a threshold).
+# /metrics serves the numbers to scrapers presenting METRICS_TOKEN, or to
+# METRICS_ALLOWED_IPS when no token is set. PERF_SERVER_TIMING adds the
+# breakdown as a Server-Timing header for staff users and
+# METRICS_ALLOWED_IPS only; it is off unless enabled.
+PERF_METRICS_ENABLED = True
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', 1.0))
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+PERF_SLOW_REQUEST_MS = 500
+PERF_SLOW_REQUEST_QUERIES = 50
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
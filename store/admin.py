@@ -1,11 +1,28 @@
 # store/admin.py
+import io
+import re
+from datetime import timedelta
+
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
 from django.utils.html import format_html
-from django.db.models import Sum, Count, Q
-from .models import Products, Order, OrderItem, ProductSize
+from django.db.models import Sum, Count
+from .models import DailyProductSales, Products, Order, OrderItem, ProductSize, StockHold
 from django.utils.text import Truncator
 from django.utils.html import format_html
-from django.db.models import F
+from django.db.models import F, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from .utils.exports import manifest_response
+from .utils.sales import sales_report, schedule_sales_rebuild, schedule_sales_sync
+from .utils.stock_alerts import LOW_STOCK_THRESHOLD
+from .utils.stock_import import StockImportError, import_stock
+
+# A whole mobile number as the checkout form asks for it
+FULL_PHONE = re.compile(r"01[0-9]{9}")
 
 
 
@@ -20,25 +37,43 @@ class ProductSizeInline(admin.TabularInline):
 
 
 # ---------- Products ----------
+class StockLevelFilter(admin.SimpleListFilter):
+    title = "stock level"
+    parameter_name = "stock"
+
+    def lookups(self, request, model_admin):
+        return [("out", "Out of stock"), ("low", f"Low (≤ {LOW_STOCK_THRESHOLD})"), ("in", "In stock")]
+
+    def queryset(self, request, queryset):
+        if self.value() == "out":
+            return queryset.filter(total_stock__lte=0)
+        if self.value() == "low":
+            return queryset.filter(total_stock__gt=0, total_stock__lte=LOW_STOCK_THRESHOLD)
+        if self.value() == "in":
+            return queryset.filter(total_stock__gt=0)
+        return queryset
+
+
 @admin.register(Products)
 class ProductsAdmin(admin.ModelAdmin):
     list_display = ("name", "classification", "price", "compare_price", "best_seller", "get_total_stock", "get_available_sizes")
-    list_filter = ("classification", "best_seller")
+    list_filter = ("classification", "best_seller", StockLevelFilter)
     search_fields = ("name",)
     list_editable = ("price", "best_seller")
     ordering = ("-best_seller", "classification", "name")
     inlines = [ProductSizeInline]  # ADD: This shows sizes when editing products
     
-    # ADD: Helper methods for displaying size info
+    # Helper methods for displaying size info, read from the maintained
+    # total_stock / available_sizes columns (no per-row queries)
     def get_total_stock(self, obj):
-        total = sum([ps.stock_count for ps in obj.productsizes.all()])
-        return total if total > 0 else "No stock"
+        return obj.total_stock if obj.total_stock > 0 else "No stock"
     get_total_stock.short_description = 'Total Stock'
+    get_total_stock.admin_order_field = 'total_stock'
     
     def get_available_sizes(self, obj):
-        sizes = [ps.size for ps in obj.productsizes.filter(stock_count__gt=0)]
-        return ', '.join(sizes) if sizes else 'No sizes'
+        return obj.available_sizes or 'No sizes'
     get_available_sizes.short_description = 'Available Sizes'
+    get_available_sizes.admin_order_field = 'available_sizes'
 
 # ---------- Inline: Order items ----------
 class OrderItemInline(admin.TabularInline):
@@ -86,7 +121,60 @@ class OrderAdmin(admin.ModelAdmin):
     list_editable = ("status",)  # if you want inline status editing, set to ("status",)
 
     # bulk actions to move status
-    actions = ["mark_pending", "mark_processing", "mark_shipped", "mark_delivered", "mark_cancelled"]
+    actions = ["mark_pending", "mark_processing", "mark_shipped", "mark_delivered", "mark_cancelled",
+               "export_manifest"]
+    # adds an "Export CSV" button that keeps the current filters
+    change_list_template = "admin/store/order/change_list.html"
+
+    def get_urls(self):
+        urls = [
+            path("export/", self.admin_site.admin_view(self.export_view), name="store_order_export"),
+        ]
+        return urls + super().get_urls()
+
+    def export_view(self, request):
+        # The changelist's own filtering, so the export matches what the
+        # list shows (filters, search, date drill-down and ordering)
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        changelist = self.get_changelist_instance(request)
+        return manifest_response(changelist.get_queryset(request))
+
+    def get_queryset(self, request):
+        # Item counts and item lines are fetched for the whole page at once,
+        # so the changelist costs the same number of queries for any page size.
+        # The count is a correlated subquery rather than Count("items"): a
+        # GROUP BY would make every filter, count and date_hierarchy query
+        # scan the whole order table instead of using its indexes.
+        items = OrderItem.objects.select_related("product").only(
+            "order_id", "size", "quantity", "product__name"
+        )
+        items_total = (
+            OrderItem.objects.filter(order=OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(items_total=Coalesce(Subquery(items_total), 0))
+            .prefetch_related(Prefetch("items", queryset=items))
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        # A whole mobile number, as checkout asks for (01XXXXXXXXX), is
+        # looked up through the phone index. Shorter digit runs may be part
+        # of an order number, a phone or an address, so they (and a number
+        # no phone starts with) get the LIKE '%...%' search over every field.
+        term = search_term.strip()
+        if FULL_PHONE.fullmatch(term):
+            upper = term[:-1] + chr(ord(term[-1]) + 1)
+            indexed = queryset.filter(Q(order_number=term) | Q(phone__gte=term, phone__lt=upper))
+            if indexed.exists():
+                return indexed, False
+        return super().get_search_results(request, queryset, search_term)
 
     def address_short(self, obj):
         addr = obj.address or ""
@@ -106,6 +194,9 @@ class OrderAdmin(admin.ModelAdmin):
         # handle None + cast to int
         obj.total_amount = int(total or 0)
         obj.save(update_fields=["total_amount"])
+        if change:
+            # Lines may have changed under an order already in the rollup
+            schedule_sales_rebuild(timezone.localdate(obj.created_at))
 
     # nice status badge in list
     def status_badge(self, obj):
@@ -121,8 +212,9 @@ class OrderAdmin(admin.ModelAdmin):
     status_badge.short_description = "Status"
 
     def items_count(self, obj):
-        return obj.items.count()
+        return obj.items_total
     items_count.short_description = "Items"
+    items_count.admin_order_field = "items_total"
 
     def items_product(self, obj):
         items = obj.items.all()
@@ -144,25 +236,36 @@ class OrderAdmin(admin.ModelAdmin):
     total_amount_display.short_description = "Order total"
 
     # --- bulk actions ---
+    def _set_status(self, queryset, status):
+        # update() skips post_save, so tell the sales rollup which orders
+        # may have moved in or out of "cancelled"
+        ids = list(queryset.exclude(status=status).values_list("pk", flat=True))
+        queryset.update(status=status)
+        schedule_sales_sync(ids)
+
     @admin.action(description="Mark selected as Pending")
     def mark_pending(self, request, queryset):
-        queryset.update(status="pending")
+        self._set_status(queryset, "pending")
 
     @admin.action(description="Mark selected as Processing")
     def mark_processing(self, request, queryset):
-        queryset.update(status="processing")
+        self._set_status(queryset, "processing")
 
     @admin.action(description="Mark selected as Shipped")
     def mark_shipped(self, request, queryset):
-        queryset.update(status="shipped")
+        self._set_status(queryset, "shipped")
 
     @admin.action(description="Mark selected as Delivered")
     def mark_delivered(self, request, queryset):
-        queryset.update(status="delivered")
+        self._set_status(queryset, "delivered")
 
     @admin.action(description="Mark selected as Cancelled")
     def mark_cancelled(self, request, queryset):
-        queryset.update(status="cancelled")
+        self._set_status(queryset, "cancelled")
+
+    @admin.action(description="Export selected as courier manifest (CSV)")
+    def export_manifest(self, request, queryset):
+        return manifest_response(queryset)
 
 
 # ---------- Order Items (direct admin) ----------
@@ -183,17 +286,78 @@ class OrderItemAdmin(admin.ModelAdmin):
 # ---------- Product Sizes (direct admin) ----------
 @admin.register(ProductSize)
 class ProductSizeAdmin(admin.ModelAdmin):
-    list_display = ('product', 'size', 'stock_count', 'is_in_stock')
+    list_display = ('product', 'size', 'stock_count', 'held', 'is_in_stock')
     list_filter = ('size', 'product__classification')
     list_editable = ('stock_count',)
     search_fields = ('product__name',)
     ordering = ('product__name', 'size')
+    change_list_template = "admin/store/productsize/change_list.html"
+    PREVIEW_ROWS = 500
     
     def is_in_stock(self, obj):
         return obj.stock_count > 0
     is_in_stock.boolean = True
     is_in_stock.short_description = 'In Stock'
 
+    def get_urls(self):
+        urls = [
+            path("import/", self.admin_site.admin_view(self.import_view), name="store_productsize_import"),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        # Uploading shows a dry run of the file; its text comes back with
+        # "Apply", and is checked and planned again inside the import's
+        # own transaction, so the preview can never go stale.
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Import stock",
+            "opts": self.model._meta,
+        }
+        if request.method == "POST":
+            upload = request.FILES.get("file")
+            apply = "apply" in request.POST and not upload
+            try:
+                text = upload.read().decode("utf-8-sig") if upload else request.POST.get("csv", "")
+                if not text.strip():
+                    raise StockImportError(["Choose a CSV file to import."])
+                plan = import_stock(io.StringIO(text, newline=""), dry_run=not apply)
+            except UnicodeDecodeError:
+                context["errors"] = ["The file is not UTF-8 text."]
+            except StockImportError as exc:
+                context["errors"] = exc.errors
+            else:
+                if apply:
+                    self.message_user(
+                        request, f"Created {len(plan.creates)} size(s) and updated {len(plan.updates)}.",
+                        messages.SUCCESS,
+                    )
+                    return redirect("admin:store_productsize_changelist")
+                changes = plan.changes()
+                context.update(
+                    plan=plan, changes=changes[:self.PREVIEW_ROWS],
+                    hidden_changes=max(len(changes) - self.PREVIEW_ROWS, 0), csv=text,
+                )
+        return TemplateResponse(request, "admin/store/productsize/import.html", context)
+
+# ---------- Stock holds (read-only: use release_expired_holds to free stock) ----------
+@admin.register(StockHold)
+class StockHoldAdmin(admin.ModelAdmin):
+    list_display = ('product', 'size', 'quantity', 'cart_token', 'expires_at')
+    list_select_related = ('product',)
+    ordering = ('expires_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # ---------- Admin site labels ----------
 admin.site.site_header = "Hunters Admin"
 admin.site.site_title = "Hunters Admin"
@@ -207,6 +371,7 @@ from django.contrib.admin import AdminSite
 from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
+from .utils.stock_alerts import get_stock_alerts
 
 # Hook into admin requests to show stock alerts
 original_admin_view = AdminSite.admin_view
@@ -215,30 +380,22 @@ def custom_admin_view(self, view, cacheable=False):
     def wrapper(request, *args, **kwargs):
         # Only show on main admin pages, not every single page
         if request.path in ['/admin/', '/admin/store/', '/admin/store/products/']:
-            # Get detailed stock info
-            out_of_stock_products = Products.objects.filter(
-                Q(productsizes__isnull=True) | 
-                ~Q(productsizes__stock_count__gt=0)
-            ).distinct()
-            
-            low_stock_sizes = ProductSize.objects.filter(
-                stock_count__lte=5, stock_count__gt=0
-            ).select_related('product')
-            
-            zero_stock_sizes = ProductSize.objects.filter(
-                stock_count=0
-            ).select_related('product')
-            
+            # Maintained summary: one primary-key read instead of catalog scans
+            alerts = get_stock_alerts()
+            out_of_stock = alerts['out_of_stock']
+            zero_stock = alerts['zero_sizes']
+            low_stock = alerts['low_sizes']
+
             # Create detailed messages with proper link colors
-            if out_of_stock_products.exists():
+            if out_of_stock['count']:
                 product_links = []
-                for product in out_of_stock_products[:5]:  # Show first 5
-                    change_url = reverse('admin:store_products_change', args=[product.pk])
-                    product_links.append(f'<a href="{change_url}" style=" text-decoration: underline; font-weight: bold;">{product.name}</a>')
+                for product in out_of_stock['items']:  # Show first 5
+                    change_url = reverse('admin:store_products_change', args=[product['product_id']])
+                    product_links.append(format_html('<a href="{}" style=" text-decoration: underline; font-weight: bold;">{}</a>', change_url, product['name']))
                 
                 products_text = ', '.join(product_links)
-                if out_of_stock_products.count() > 5:
-                    products_text += f' <em>and {out_of_stock_products.count() - 5} more</em>'
+                if out_of_stock['count'] > 5:
+                    products_text += f' <em>and {out_of_stock["count"] - 5} more</em>'
                 
                 products_list_url = reverse('admin:store_products_changelist')
                 message = mark_safe(
@@ -247,15 +404,15 @@ def custom_admin_view(self, view, cacheable=False):
                 )
                 messages.error(request, message)
             
-            if zero_stock_sizes.exists():
+            if zero_stock['count']:
                 size_links = []
-                for size in zero_stock_sizes[:5]:  # Show first 5
-                    change_url = reverse('admin:store_products_change', args=[size.product.pk])
-                    size_links.append(f'<a href="{change_url}" style="text-decoration: underline; font-weight: bold;">{size.product.name} ({size.get_size_display()})</a>')
+                for size in zero_stock['items']:  # Show first 5
+                    change_url = reverse('admin:store_products_change', args=[size['product_id']])
+                    size_links.append(format_html('<a href="{}" style="text-decoration: underline; font-weight: bold;">{} ({})</a>', change_url, size['name'], size['size']))
                 
                 sizes_text = ', '.join(size_links)
-                if zero_stock_sizes.count() > 5:
-                    sizes_text += f' <em>and {zero_stock_sizes.count() - 5} more</em>'
+                if zero_stock['count'] > 5:
+                    sizes_text += f' <em>and {zero_stock["count"] - 5} more</em>'
                 
                 sizes_list_url = reverse('admin:store_productsize_changelist')
                 message = mark_safe(
@@ -264,15 +421,15 @@ def custom_admin_view(self, view, cacheable=False):
                 )
                 messages.warning(request, message)
                 
-            if low_stock_sizes.exists():
+            if low_stock['count']:
                 size_links = []
-                for size in low_stock_sizes[:5]:  # Show first 5
-                    change_url = reverse('admin:store_products_change', args=[size.product.pk])
-                    size_links.append(f'<a href="{change_url}" style="text-decoration: underline; font-weight: bold;">{size.product.name} ({size.get_size_display()}: {size.stock_count} left)</a>')
+                for size in low_stock['items']:  # Show first 5
+                    change_url = reverse('admin:store_products_change', args=[size['product_id']])
+                    size_links.append(format_html('<a href="{}" style="text-decoration: underline; font-weight: bold;">{} ({}: {} left)</a>', change_url, size['name'], size['size'], size['stock']))
                 
                 sizes_text = ', '.join(size_links)
-                if low_stock_sizes.count() > 5:
-                    sizes_text += f' <em>and {low_stock_sizes.count() - 5} more</em>'
+                if low_stock['count'] > 5:
+                    sizes_text += f' <em>and {low_stock["count"] - 5} more</em>'
                 
                 sizes_list_url = reverse('admin:store_productsize_changelist')
                 message = mark_safe(
@@ -285,4 +442,42 @@ def custom_admin_view(self, view, cacheable=False):
     return wrapper
 
 # Apply the custom wrapper
-AdminSite.admin_view = lambda self, view, cacheable=False: original_admin_view(self, custom_admin_view(self, view, cacheable), cacheable)
\ No newline at end of file
+AdminSite.admin_view = lambda self, view, cacheable=False: original_admin_view(self, custom_admin_view(self, view, cacheable), cacheable)
+
+# ---------- Sales dashboard (reads the sales rollups only) ----------
+@admin.register(DailyProductSales)
+class DailySalesAdmin(admin.ModelAdmin):
+    PERIODS = (7, 30, 90, 365)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            period = int(request.GET.get("days", 30))
+        except ValueError:
+            period = 30
+        if period not in self.PERIODS:
+            period = 30
+        end = timezone.localdate()
+        report = sales_report(end - timedelta(days=period - 1), end)
+        peak = max((day["revenue"] for day in report["days"]), default=0) or 1
+        for day in report["days"]:
+            day["width"] = round(100 * day["revenue"] / peak)
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Sales dashboard",
+            "opts": self.model._meta,
+            "period": period,
+            "periods": self.PERIODS,
+            "report": report,
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, "admin/store/dailyproductsales/dashboard.html", context)
@@ -0,0 +1,123 @@
+import hashlib
+
+from django.db.models import Prefetch
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Products, ProductSize
+from .serializers import ProductSerializer
+from .utils.catalog_version import get_catalog_version
+from .utils.search import SORTS, search_index
+
+
+class ConditionalGetMixin:
+    """
+    Adds a strong ETag to successful GET responses and answers 304 Not
+    Modified when the client's If-None-Match already has it. The ETag comes
+    from the catalog version and the request URL, so a revalidation costs
+    one primary-key read and never runs the view.
+    """
+
+    def get_version(self, request):
+        """What the response content depends on besides the URL."""
+        return get_catalog_version(request)[0]
+
+    def get_etag(self, request):
+        key = f"{self.get_version(request)}|{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+        return quote_etag(hashlib.sha256(key.encode()).hexdigest()[:32])
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        etag = self.get_etag(request)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            not_modified = HttpResponseNotModified()
+            not_modified['ETag'] = etag
+            patch_vary_headers(not_modified, ['Accept'])
+            return not_modified
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            patch_vary_headers(response, ['Accept'])
+        return response
+
+
+class ProductViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only catalog: /api/products/ (cursor-paginated) and
+    /api/products/<id>/. Supports ?classification=, ?in_stock=1 and
+    ?fields=id,name,... to return only what the client needs.
+    """
+
+    serializer_class = ProductSerializer
+
+    def get_queryset(self):
+        queryset = Products.objects.order_by('id')
+        params = self.request.query_params
+        if params.get('classification'):
+            queryset = queryset.filter(classification=params['classification'])
+        if params.get('in_stock') in ('1', 'true'):
+            queryset = queryset.filter(total_stock__gt=0)
+
+        fields = params.get('fields')
+        if not fields or 'sizes' in fields.split(','):
+            queryset = queryset.prefetch_related(
+                Prefetch('productsizes', queryset=ProductSize.objects.order_by('id'))
+            )
+        return queryset
+
+
+class SearchView(ConditionalGetMixin, APIView):
+    """
+    /api/search/?q=&classification=&size=&min_price=&max_price=&in_stock=1&sort=
+    Served from the in-memory search index, so no query scans the catalog.
+    classification and size take comma-separated values (any may match);
+    the response has `count`, `results` and `facets` with counts for each
+    classification and size and the price range.
+    """
+
+    max_limit = 100
+
+    def get_version(self, request):
+        # Answers come from the index alone, which can lag the catalog
+        # version by SEARCH_INDEX_TTL when other workers write
+        return search_index.fingerprint()
+
+    def get(self, request):
+        params = request.query_params
+
+        def number(name, default=None, minimum=0):
+            value = params.get(name)
+            if value in (None, ''):
+                return default
+            try:
+                value = int(value)
+            except ValueError:
+                raise ValidationError({name: 'Must be a whole number.'})
+            if value < minimum:
+                raise ValidationError({name: f'Must be at least {minimum}.'})
+            return value
+
+        def values(name):
+            return [value.strip() for value in params.get(name, '').split(',') if value.strip()]
+
+        sort = params.get('sort') or 'relevance'
+        if sort not in SORTS:
+            raise ValidationError({'sort': f"Must be one of: {', '.join(SORTS)}."})
+
+        return Response(search_index.search(
+            query=params.get('q', ''),
+            classifications=values('classification'),
+            sizes=values('size'),
+            min_price=number('min_price'),
+            max_price=number('max_price'),
+            in_stock=params.get('in_stock') in ('1', 'true'),
+            sort=sort,
+            limit=min(number('limit', 24, minimum=1), self.max_limit),
+            offset=number('offset', 0),
+        ))
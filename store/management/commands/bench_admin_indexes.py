@@ -0,0 +1,161 @@
+import random
+import statistics
+import time
+import warnings
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from store.models import Order, OrderItem, Products
+from store.utils.bench import scratch_database
+
+AREAS = [
+    'Maadi', 'Zamalek', 'Heliopolis', 'Nasr City', 'Dokki', 'Mohandessin', 'New Cairo', 'Sheikh Zayed',
+    '6th of October', 'Shubra', 'Giza', 'Haram', 'Agouza', 'Abbasia', 'Rehab', 'Madinaty',
+    'Downtown', 'Garden City', 'Manial', 'Sayeda Zeinab', 'Ain Shams', 'Obour', 'Shorouk', 'Helwan',
+]
+NAMES = ['Ahmed', 'Mohamed', 'Omar', 'Youssef', 'Mariam', 'Nour', 'Salma', 'Hana', 'Karim', 'Laila']
+STATUSES = ['delivered'] * 70 + ['shipped'] * 10 + ['cancelled'] * 8 + ['processing'] * 7 + ['pending'] * 5
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL', None]
+
+# The indexes added for these paths, dropped to measure the "before" side
+ORDER_INDEXES = ['order_created_idx', 'order_status_created_idx', 'order_area_created_idx', 'order_phone_idx']
+
+
+def _paths(today):
+    week_ago = (today - timedelta(days=7)).strftime('%Y-%m-%d')
+    tomorrow = (today + timedelta(days=1)).strftime('%Y-%m-%d')
+    month = today - timedelta(days=40)
+    return [
+        (Order, 'default ordering', {}),
+        (Order, 'status filter', {'status__exact': 'pending'}),
+        (Order, 'area filter', {'area': 'Zamalek'}),
+        (Order, 'status + area', {'status__exact': 'shipped', 'area': 'Maadi'}),
+        (Order, 'created_at: past 7 days', {'created_at__gte': week_ago, 'created_at__lt': tomorrow}),
+        (Order, 'date_hierarchy month', {'created_at__year': month.year, 'created_at__month': month.month}),
+        (Order, 'search phone number', {'q': '01012345678'}),
+        (Order, 'search order number', {'q': '500000'}),
+        (Order, 'search name', {'q': 'Mariam'}),
+        (OrderItem, 'item: order__status', {'order__status__exact': 'pending'}),
+        (OrderItem, 'item: product__classification', {'product__classification__exact': 'suit'}),
+        (OrderItem, 'item: size', {'size__exact': 'XL'}),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database with a large order history and time every order/order-item "
+        "changelist filter and search, with and without the admin indexes, printing query plans."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per path (median is reported).")
+        parser.add_argument('--plans', action='store_true', help="Print EXPLAIN QUERY PLAN for every query.")
+
+    def seed(self, count):
+        rng = random.Random(42)
+        products = Products.objects.bulk_create([
+            Products(name=f'Item {i}', classification=rng.choice(['tshirts', 'shorts', 'suit', 'trouser']), price=500)
+            for i in range(200)
+        ])
+        classifications = {p.pk: p.classification for p in products}
+        product_ids = list(classifications)
+        now = datetime.now(dt_timezone.utc)
+        span = 2 * 365 * 24 * 3600
+
+        order_table, item_table = Order._meta.db_table, OrderItem._meta.db_table
+        order_sql = (
+            f'INSERT INTO "{order_table}" (id, first_name, phone, address, area, nearest_landmark, '
+            f'order_number, status, total_amount, notes, created_at, updated_at, sales_counted) '
+            f'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'
+        )
+        item_sql = (
+            f'INSERT INTO "{item_table}" (order_id, product_id, size, quantity, price, classification) '
+            f'VALUES (%s, %s, %s, %s, %s, %s)'
+        )
+        batch = 20_000
+        with connection.cursor() as cursor:
+            for start in range(1, count + 1, batch):
+                orders, items = [], []
+                for pk in range(start, min(start + batch, count + 1)):
+                    # Orders arrive in time order, as they do in production
+                    created = now - timedelta(seconds=span * (count - pk) / count + rng.random())
+                    status = rng.choice(STATUSES)
+                    orders.append((
+                        pk, rng.choice(NAMES), f'010{rng.randrange(10**8):08d}', f'{pk} Bench St',
+                        rng.choice(AREAS), '', str(pk), status, 500, '', created, created, status != 'cancelled',
+                    ))
+                    for _ in range(rng.randint(1, 3)):
+                        product_id = rng.choice(product_ids)
+                        items.append((pk, product_id, rng.choice(SIZES), 1, 500, classifications[product_id]))
+                cursor.executemany(order_sql, orders)
+                cursor.executemany(item_sql, items)
+            cursor.execute('ANALYZE')
+
+    def run_path(self, model, params, user, repeat, capture):
+        model_admin = admin.site._registry[model]
+        timings, queries = [], []
+        for run in range(repeat):
+            request = RequestFactory().get('/', params)
+            request.user = user
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as ctx:
+                response = model_admin.changelist_view(request)
+                response.render()
+            timings.append((time.perf_counter() - started) * 1000)
+            queries = ctx.captured_queries
+        return statistics.median(timings), queries
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def handle(self, *args, **options):
+        # The admin's own date filters pass naive dates, as in production
+        warnings.filterwarnings('ignore', message='DateTimeField .* received a naive datetime')
+        with scratch_database(), override_settings(DEBUG=False):
+            started = time.perf_counter()
+            self.seed(options['orders'])
+            items = OrderItem.objects.count()
+            self.stdout.write(f"Seeded {options['orders']} orders / {items} items in {time.perf_counter() - started:.1f}s")
+
+            user = get_user_model().objects.create_superuser('bench', 'bench@example.com', 'bench')
+            paths = _paths(datetime.now(dt_timezone.utc))
+
+            results = {}
+            for phase in ('after', 'before'):
+                if phase == 'before':
+                    with connection.cursor() as cursor:
+                        for name in ORDER_INDEXES:
+                            cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+                        cursor.execute('ANALYZE')
+                for model, label, params in paths:
+                    elapsed, queries = self.run_path(model, params, user, options['repeat'], phase)
+                    results.setdefault(label, {})[phase] = (elapsed, queries)
+
+            self.stdout.write(f"\n{'path':<32} {'before':>10} {'after':>10} {'queries':>8}")
+            for model, label, params in paths:
+                before, _ = results[label]['before']
+                after, queries = results[label]['after']
+                self.stdout.write(f"{label:<32} {before:>8.1f}ms {after:>8.1f}ms {len(queries):>8}")
+
+            self.stdout.write("\nQuery plans with the indexes (queries on the order tables):")
+            for model, label, params in paths:
+                _, queries = results[label]['after']
+                self.stdout.write(f"\n[{label}] {params or ''}")
+                for query in queries:
+                    sql = query['sql']
+                    if not options['plans'] and f'FROM "{model._meta.db_table}"' not in sql:
+                        continue
+                    if not sql.lstrip().upper().startswith('SELECT'):
+                        continue
+                    self.stdout.write(f"  {query['time']}s  {sql[:110]}{'...' if len(sql) > 110 else ''}")
+                    for line in self.explain(sql):
+                        self.stdout.write(f"      {line}")
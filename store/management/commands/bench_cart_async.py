@@ -0,0 +1,112 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from store.models import Products, ProductSize
+from store.utils.bench import scratch_database, summarize
+from store.utils.stock_index import stock_index
+
+# Each simulated shopper adds two units of a product, reads the cart
+# summary and removes one unit, keeping its own session cookies.
+STEPS = ('add', 'add', 'summary', 'remove')
+
+
+def _request(client, step, product_id):
+    if step == 'summary':
+        return client.get(reverse('cart_summary'))
+    name = 'add_to_cart' if step == 'add' else 'remove_from_cart'
+    return client.post(reverse(name), {'product_id': product_id, 'size': 'M'})
+
+
+def _sync_shopper(product_ids, rounds, index):
+    client = Client(raise_request_exception=False)
+    timings, failures = [], 0
+    try:
+        for round_ in range(rounds):
+            product_id = product_ids[(index + round_) % len(product_ids)]
+            for step in STEPS:
+                started = time.perf_counter()
+                response = _request(client, step, product_id)
+                if response.status_code != 200 or not response.json().get('ok'):
+                    failures += 1
+                    continue
+                timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        connections.close_all()
+    return timings, failures
+
+
+async def _async_shopper(product_ids, rounds, index):
+    client = AsyncClient(raise_request_exception=False)
+    timings, failures = [], 0
+    for round_ in range(rounds):
+        product_id = product_ids[(index + round_) % len(product_ids)]
+        for step in STEPS:
+            started = time.perf_counter()
+            response = await _request(client, step, product_id)
+            if response.status_code != 200 or not response.json().get('ok'):
+                failures += 1
+                continue
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings, failures
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare cart endpoint throughput through the WSGI handler (a fixed pool of "
+        "worker threads) and the ASGI handler (one event loop) at the same concurrency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shoppers', type=int, default=32, help="Concurrent simulated shoppers.")
+        parser.add_argument('--rounds', type=int, default=10, help="Add/add/summary/remove rounds per shopper.")
+        parser.add_argument('--wsgi-threads', type=int, default=4, help="Worker threads of the WSGI deployment.")
+        parser.add_argument('--products', type=int, default=20)
+        parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        modes = ['wsgi', 'asgi'] if options['mode'] == 'both' else [options['mode']]
+        shoppers, rounds = options['shoppers'], options['rounds']
+        for mode in modes:
+            with scratch_database(), override_settings(ALLOWED_HOSTS=['testserver'], DEBUG=False):
+                products = Products.objects.bulk_create([
+                    Products(name=f'Bench Tee {i}', classification='tshirts', price=500)
+                    for i in range(options['products'])
+                ])
+                ProductSize.objects.bulk_create([
+                    ProductSize(product=product, size='M', stock_count=1_000_000) for product in products
+                ])
+                product_ids = [product.pk for product in products]
+                stock_index.invalidate()
+                connections.close_all()
+
+                started = time.perf_counter()
+                if mode == 'wsgi':
+                    with ThreadPoolExecutor(max_workers=options['wsgi_threads']) as pool:
+                        results = list(pool.map(
+                            lambda index: _sync_shopper(product_ids, rounds, index), range(shoppers),
+                        ))
+                else:
+                    async def run():
+                        return await asyncio.gather(*[
+                            _async_shopper(product_ids, rounds, index) for index in range(shoppers)
+                        ])
+                    results = asyncio.run(run())
+                elapsed = time.perf_counter() - started
+                stock_index.invalidate()
+
+            timings = [t for shopper_timings, _ in results for t in shopper_timings]
+            failures = sum(f for _, f in results)
+            stats = summarize(timings)
+            label = f"wsgi ({options['wsgi_threads']} threads)" if mode == 'wsgi' else 'asgi (1 loop)'
+            self.stdout.write(
+                f"{label:>18}: {len(timings)} requests in {elapsed:.2f}s "
+                f"({len(timings) / elapsed:.1f} req/s), {failures} failed | "
+                f"p50 {stats['p50_ms']}ms p95 {stats['p95_ms']}ms p99 {stats['p99_ms']}ms"
+            )
@@ -0,0 +1,91 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections, transaction
+from django.test.utils import override_settings
+
+from store.models import Order, OrderItem, Products
+from store.utils.bench import scratch_database, summarize
+from store.utils.order_numbers import allocate_order_number, reset_block
+
+
+def _legacy_order_number():
+    # The numbering Order.save() used before the counter table: scan the
+    # newest order under select_for_update and add one.
+    last = Order.objects.select_for_update().order_by('-id').first()
+    last_num = int(last.order_number) if (last and str(last.order_number).isdigit()) else 0
+    return str(last_num + 1)
+
+
+def _checkout(mode, product_id, worker, seq):
+    number = allocate_order_number() if mode == 'allocator' else None
+    with transaction.atomic():
+        if mode == 'legacy':
+            number = _legacy_order_number()
+        order = Order.objects.create(
+            order_number=number,
+            first_name=f'bench-{worker}',
+            phone='01000000000',
+            address=f'{seq} Bench St',
+            area='Cairo',
+            nearest_landmark='',
+            total_amount=500,
+        )
+        OrderItem.objects.create(order=order, product_id=product_id, quantity=1, price=500)
+
+
+def _worker(args):
+    mode, product_id, worker, count, block_size = args
+    connections.close_all()
+    reset_block()
+    timings, failures = [], 0
+    with override_settings(ORDER_NUMBER_BLOCK_SIZE=block_size):
+        for seq in range(count):
+            started = time.perf_counter()
+            try:
+                _checkout(mode, product_id, worker, seq)
+            except DatabaseError:
+                failures += 1
+                continue
+            timings.append((time.perf_counter() - started) * 1000)
+    connections.close_all()
+    return timings, failures
+
+
+class Command(BaseCommand):
+    help = "Compare checkout throughput of legacy order numbering against the counter allocator."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--orders', type=int, default=200, help="Orders placed by each process.")
+        parser.add_argument('--block-size', type=int, default=1,
+                            help="ORDER_NUMBER_BLOCK_SIZE used in allocator mode.")
+        parser.add_argument('--mode', choices=['legacy', 'allocator', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        modes = ['legacy', 'allocator'] if options['mode'] == 'both' else [options['mode']]
+        for mode in modes:
+            with scratch_database():
+                product_id = Products.objects.create(name='Bench Tee', classification='tshirts', price=500).pk
+                connections.close_all()
+                jobs = [
+                    (mode, product_id, worker, options['orders'], options['block_size'])
+                    for worker in range(options['processes'])
+                ]
+                started = time.perf_counter()
+                with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+                    results = pool.map(_worker, jobs)
+                elapsed = time.perf_counter() - started
+
+                timings = [t for worker_timings, _ in results for t in worker_timings]
+                failures = sum(f for _, f in results)
+                numbers = list(Order.objects.values_list('order_number', flat=True))
+
+            stats = summarize(timings)
+            self.stdout.write(
+                f"{mode:>9}: {len(timings)} orders in {elapsed:.2f}s "
+                f"({len(timings) / elapsed:.1f} orders/s), {failures} failed, "
+                f"{len(numbers) - len(set(numbers))} duplicate numbers | "
+                f"p50 {stats['p50_ms']}ms p95 {stats['p95_ms']}ms p99 {stats['p99_ms']}ms"
+            )
@@ -0,0 +1,214 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+import django
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from store import urls as store_urls
+from store.models import Order, ProductSize
+from store.utils.bench import scratch_database, summarize
+from store.utils.search import search_index
+from store.utils.seed import seed_store
+from store.utils.stock_index import stock_index
+
+CHECKOUT_FORM = {
+    'first_name': 'Bench', 'phone': '01000000000', 'address': '1 Bench St', 'area': 'Maadi',
+    'nearest_landmark': '', 'notes': '',
+}
+
+
+def _add(client, fixture):
+    return client.post(reverse('add_to_cart'), {'product_id': fixture['product_id'], 'size': fixture['size']})
+
+
+def _place_order(client, fixture):
+    response = client.post(reverse('place_order'), CHECKOUT_FORM)
+    # Failed checkouts redirect too, back to the checkout page
+    if response.status_code == 302 and '/order-success/' not in response['Location']:
+        raise CommandError(f"place_order failed and redirected to {response['Location']}.")
+    return response
+
+
+# Storefront routes by URL name: (prepare, request, expected status). `prepare`
+# runs untimed before every request, for routes that need a cart first.
+ROUTES = {
+    'home': (None, lambda c, f: c.get(reverse('home')), 200),
+    'products': (None, lambda c, f: c.get(reverse('products')), 200),
+    'product_section': (None, lambda c, f: c.get(
+        reverse('product_section', args=[f['section']]), {'after': f['section_after']}), 200),
+    'checkout': (_add, lambda c, f: c.get(reverse('checkout')), 200),
+    'cart_summary': (_add, lambda c, f: c.get(reverse('cart_summary')), 200),
+    'add_to_cart': (None, _add, 200),
+    'remove_from_cart': (_add, lambda c, f: c.post(
+        reverse('remove_from_cart'), {'product_id': f['product_id'], 'size': f['size']}), 200),
+    'place_order': (_add, _place_order, 302),
+    'order_success': (None, lambda c, f: c.get(reverse('order_success', args=[f['order_number']])), 200),
+    'api_products': (None, lambda c, f: c.get(reverse('api_products')), 200),
+    'api_product': (None, lambda c, f: c.get(reverse('api_product', args=[f['product_id']])), 200),
+    'api_search': (None, lambda c, f: c.get(reverse('api_search'), {'q': 'classic', 'in_stock': '1'}), 200),
+    'metrics': (None, lambda c, f: c.get(reverse('metrics')), 200),
+}
+
+
+def _fixture():
+    # A product with plenty of stock in one size, so cart and checkout
+    # requests never run it out
+    size = ProductSize.objects.filter(product__classification='tshirts', stock_count__gt=0).order_by('id').first()
+    if size is None:
+        raise CommandError("The seeded catalog has no t-shirt in stock; seed more products.")
+    size.stock_count = 10**9
+    size.save()
+    return {
+        'product_id': size.product_id,
+        'size': size.size,
+        'section': 'tshirts',
+        'section_after': size.product_id,
+        'order_number': Order.objects.order_by('-created_at').values_list('order_number', flat=True).first(),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database and time every storefront route and admin changelist "
+        "in-process, reporting p50/p95/p99 latency and SQL query counts and saving the "
+        "results as JSON for comparison with earlier runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=20_000)
+        parser.add_argument('--repeat', type=int, default=50, help="Timed requests per route.")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per route first.")
+        parser.add_argument('--route', action='append', default=[],
+                            help="Only benchmark routes whose name contains this (repeatable).")
+        parser.add_argument('--output', default='bench-results/routes-{timestamp}.json',
+                            help="Where to write the JSON results ('-' to skip).")
+        parser.add_argument('--compare', help="Earlier JSON results to print the difference against.")
+
+    def time_route(self, name, prepare, request, expected, fixture, repeat, warmup):
+        client = Client(raise_request_exception=True)
+        timings, queries, statuses = [], [], set()
+        for run in range(warmup + repeat):
+            if prepare:
+                prepare(client, fixture)
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = request(client, fixture)
+                elapsed = (time.perf_counter() - started) * 1000
+            statuses.add(response.status_code)
+            if response.status_code != expected:
+                raise CommandError(f"{name} answered {response.status_code}, expected {expected}.")
+            if run >= warmup:
+                timings.append(elapsed)
+                queries.append(len(ctx.captured_queries))
+        return dict(summarize(timings), queries=max(queries), status=sorted(statuses))
+
+    def routes(self, fixture, user):
+        named = [pattern.name for pattern in store_urls.urlpatterns if pattern.name]
+        missing = sorted(set(named) - set(ROUTES))
+        if missing:
+            self.stderr.write(f"No benchmark for route(s): {', '.join(missing)}")
+        for name in named:
+            if name in ROUTES:
+                yield name, ROUTES[name]
+
+        def login(client, fixture):
+            if '_auth_user_id' not in client.session:
+                client.force_login(user)
+
+        for model in admin.site._registry:
+            opts = model._meta
+            name = f'admin:{opts.app_label}_{opts.model_name}_changelist'
+            url = reverse(name)
+            yield name, (login, lambda c, f, url=url: c.get(url), 200)
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1.")
+        results = {}
+        with scratch_database(), override_settings(ALLOWED_HOSTS=['testserver'], DEBUG=False):
+            started = time.perf_counter()
+            counts = seed_store(products=options['products'], orders=options['orders'])
+            self.stdout.write(
+                f"Seeded {counts['products']} products / {counts['orders']} orders "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+            stock_index.invalidate()
+            search_index.invalidate()
+            fixture = _fixture()
+            user = get_user_model().objects.create_superuser('bench', 'bench@example.com', 'bench')
+
+            for name, (prepare, request, expected) in self.routes(fixture, user):
+                if options['route'] and not any(part in name for part in options['route']):
+                    continue
+                results[name] = self.time_route(
+                    name, prepare, request, expected, fixture, options['repeat'], options['warmup'],
+                )
+                stats = results[name]
+                self.stdout.write(
+                    f"{name:<44} p50 {stats['p50_ms']:>8.2f}ms  p95 {stats['p95_ms']:>8.2f}ms  "
+                    f"p99 {stats['p99_ms']:>8.2f}ms  {stats['queries']:>3} queries"
+                )
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'revision': _git_revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'products': counts['products'],
+                'orders': counts['orders'],
+                'repeat': options['repeat'],
+            },
+            'routes': results,
+        }
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+        if options['output'] != '-':
+            path = options['output'].format(timestamp=datetime.now().strftime('%Y%m%d-%H%M%S'))
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w') as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {path}")
+
+    def compare(self, path, results):
+        try:
+            with open(path) as fh:
+                baseline = json.load(fh)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+        meta = baseline.get('meta', {})
+        self.stdout.write(f"\nCompared with {path} ({meta.get('revision') or 'unknown revision'}, {meta.get('timestamp')}):")
+        for name, stats in results.items():
+            before = baseline.get('routes', {}).get(name)
+            if before is None:
+                self.stdout.write(f"{name:<44} new")
+                continue
+            deltas = []
+            for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+                change = (stats[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+                deltas.append(f"{key[:3]} {change:+6.1f}%")
+            queries = stats['queries'] - before['queries']
+            self.stdout.write(f"{name:<44} {'  '.join(deltas)}  queries {queries:+d}")
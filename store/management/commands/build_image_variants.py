@@ -0,0 +1,23 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from store.models import Products
+from store.utils.images import refresh_image_variants
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG variants for product images that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Encoder processes to run in parallel.")
+        parser.add_argument('--force', action='store_true',
+                            help="Rebuild variants for every product image.")
+
+    def handle(self, *args, **options):
+        products = Products.objects.exclude(image='').exclude(image__isnull=True)
+        updated, errors = refresh_image_variants(products, workers=options['workers'], force=options['force'])
+        for name, error in errors.items():
+            self.stderr.write(f"{name}: {error}")
+        self.stdout.write(f"Updated {updated} product(s), {len(errors)} failed.")
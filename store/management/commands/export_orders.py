@@ -0,0 +1,57 @@
+import csv
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.models import Order
+from store.utils.exports import MANIFEST_CHUNK_SIZE, manifest_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the courier manifest (orders with their item lines and sizes) as CSV, "
+        "streamed in chunks so memory stays flat for any number of orders."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', nargs='+', default=['pending', 'processing'],
+                            choices=[value for value, _ in Order.STATUS_CHOICES])
+        parser.add_argument('--date', help="Only orders placed on this day (YYYY-MM-DD, local time).")
+        parser.add_argument('--since', help="Only orders placed on or after this day (YYYY-MM-DD).")
+        parser.add_argument('--area', action='append', default=[], help="Only orders for this area (repeatable).")
+        parser.add_argument('--output', '-o', default='-', help="File to write, '-' for stdout.")
+        parser.add_argument('--chunk-size', type=int, default=MANIFEST_CHUNK_SIZE)
+
+    def _day_start(self, value, option):
+        try:
+            day = datetime.date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"{option} must be a date like 2025-01-31.")
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+    def handle(self, *args, **options):
+        orders = Order.objects.filter(status__in=options['status']).order_by('created_at', 'pk')
+        if options['date']:
+            start = self._day_start(options['date'], '--date')
+            orders = orders.filter(created_at__gte=start, created_at__lt=start + datetime.timedelta(days=1))
+        if options['since']:
+            orders = orders.filter(created_at__gte=self._day_start(options['since'], '--since'))
+        if options['area']:
+            orders = orders.filter(area__in=options['area'])
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        if options['output'] == '-':
+            self._write(self.stdout, orders, options['chunk_size'])
+        else:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as fh:
+                count = self._write(fh, orders, options['chunk_size'])
+            self.stderr.write(f"Wrote {count} line(s) to {options['output']}.")
+
+    def _write(self, fh, orders, chunk_size):
+        writer = csv.writer(fh)
+        count = -1
+        for count, row in enumerate(manifest_rows(orders, chunk_size=chunk_size)):
+            writer.writerow(row)
+        return count
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.utils.stock_import import StockImportError, import_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Set size stock from a CSV with product_id (or product name), size and stock columns, "
+        "creating missing sizes. Every row is checked first; an invalid file changes nothing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file to import.")
+        parser.add_argument('--dry-run', action='store_true', help="Show what would change without writing.")
+        parser.add_argument('--show', type=int, default=50, help="Changes to list (0 for none, -1 for all).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as fh:
+                plan = import_stock(fh, dry_run=options['dry_run'])
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc.strerror}.")
+        except UnicodeDecodeError:
+            raise CommandError(f"{options['path']} is not UTF-8 text.")
+        except StockImportError as exc:
+            raise CommandError("\n".join(["Nothing was imported:", *exc.errors]))
+
+        changes = plan.changes()
+        shown = changes if options['show'] < 0 else changes[:options['show']]
+        for product_id, name, size, old, new in shown:
+            before = "new" if old is None else old
+            self.stdout.write(f"{name} (#{product_id}) {size}: {before} -> {new}")
+        if len(shown) < len(changes):
+            self.stdout.write(f"... and {len(changes) - len(shown)} more.")
+
+        if options['dry_run']:
+            self.stdout.write(
+                f"Dry run: would create {len(plan.creates)} size(s) and update {len(plan.updates)}, "
+                f"{plan.unchanged} unchanged. Nothing was written."
+            )
+        else:
+            self.stdout.write(
+                f"Created {len(plan.creates)} size(s) and updated {len(plan.updates)}, "
+                f"{plan.unchanged} unchanged, in {time.perf_counter() - started:.1f}s."
+            )
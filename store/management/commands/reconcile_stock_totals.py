@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Products
+from store.utils.stock_totals import refresh_stock_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute Products.total_stock and available_sizes from ProductSize and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ids = list(Products.objects.order_by('pk').values_list('pk', flat=True))
+        repaired = 0
+        for start in range(0, len(ids), options['batch_size']):
+            with transaction.atomic():
+                changed = refresh_stock_totals(ids[start:start + options['batch_size']])
+            for product in changed:
+                self.stdout.write(f"Repaired #{product.pk}: {product.total_stock} in stock ({product.available_sizes or 'no sizes'})")
+            repaired += len(changed)
+        self.stdout.write(f"Checked {len(ids)} product(s), repaired {repaired}.")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.utils.holds import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Give the stock of expired cart holds back. Safe to run from cron every minute."
+
+    def handle(self, *args, **options):
+        released = release_expired_holds()
+        self.stdout.write(f"Released {released} expired hold(s).")
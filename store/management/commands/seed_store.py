@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.utils.seed import seed_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the database with a synthetic catalog (products and sized stock) and a "
+        "historical order book, for local load testing and benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=365, help="Spread the order history over this many days.")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed, so runs are reproducible.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if min(options['products'], options['orders'], options['days']) < 0 or options['batch_size'] < 1:
+            raise CommandError("Counts must not be negative and --batch-size must be positive.")
+        started = time.perf_counter()
+        counts = seed_store(
+            products=options['products'],
+            orders=options['orders'],
+            days=options['days'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(
+            f"Seeded {counts['products']} products, {counts['sizes']} sizes, "
+            f"{counts['orders']} orders and {counts['items']} order items "
+            f"in {time.perf_counter() - started:.1f}s."
+        )
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+def seed_order_counter(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderNumberCounter = apps.get_model('store', 'OrderNumberCounter')
+    numbers = Order.objects.values_list('order_number', flat=True)
+    last = max((int(n) for n in numbers if str(n).isdigit()), default=0)
+    OrderNumberCounter.objects.update_or_create(name='order', defaults={'value': last})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_alter_productsize_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberCounter',
+            fields=[
+                ('name', models.CharField(max_length=30, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_order_counter, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='products',
+            name='classification',
+            field=models.CharField(choices=[('tshirts', 'T Shirts'), ('shorts', 'Shorts'), ('best-sellers', 'Best Seller'), ('suit', 'Suit'), ('trouser', 'Trouser')], max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='productsize',
+            name='size',
+            field=models.CharField(choices=[('XS', 'XSmall'), ('S', 'Small'), ('M', 'Medium'), ('L', 'Large'), ('XL', 'XLarge'), ('XXL', 'XXLarge'), ('30', '30'), ('32', '32'), ('33', '33'), ('34', '34'), ('36', '36'), ('38', '38'), ('40', '40'), ('42', '42'), ('44', '44'), ('46', '46')], max_length=12),
+        ),
+    ]
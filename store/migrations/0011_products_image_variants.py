@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_stockhold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='products',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
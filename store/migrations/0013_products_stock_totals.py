@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:21
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_stock_totals(apps, schema_editor):
+    Products = apps.get_model('store', 'Products')
+    ProductSize = apps.get_model('store', 'ProductSize')
+    totals, sizes = defaultdict(int), defaultdict(list)
+    for product_id, size, stock in ProductSize.objects.order_by('id').values_list('product_id', 'size', 'stock_count'):
+        totals[product_id] += max(stock, 0)
+        if stock > 0:
+            sizes[product_id].append(size)
+    products = list(Products.objects.all())
+    for product in products:
+        product.total_stock = totals.get(product.pk, 0)
+        product.available_sizes = ', '.join(sizes.get(product.pk, []))
+    Products.objects.bulk_update(products, ['total_stock', 'available_sizes'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_stockalertsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='products',
+            name='available_sizes',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='products',
+            name='total_stock',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_stock_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['classification', 'id'], name='products_section_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['best_seller', 'id'], name='products_best_seller_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_order_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='sales_counted',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.CreateModel(
+            name='DailyAreaSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('area', models.CharField(max_length=50)),
+                ('classification', models.CharField(max_length=12)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'daily area sales',
+                'unique_together': {('day', 'area', 'classification')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('size', models.CharField(blank=True, default='', max_length=12)),
+                ('classification', models.CharField(max_length=12)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='store.products')),
+            ],
+            options={
+                'verbose_name_plural': 'daily sales',
+                'unique_together': {('day', 'product', 'size')},
+            },
+        ),
+    ]
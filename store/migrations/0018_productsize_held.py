@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:17
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def move_holds_to_held(apps, schema_editor):
+    # Holds used to be taken out of stock_count; put those units back on
+    # the shelf and count them as held instead.
+    Products = apps.get_model('store', 'Products')
+    ProductSize = apps.get_model('store', 'ProductSize')
+    StockHold = apps.get_model('store', 'StockHold')
+    held = defaultdict(int)
+    for product_id, size, quantity in StockHold.objects.values_list('product_id', 'size', 'quantity'):
+        held[(product_id, size)] += quantity
+    if not held:
+        return
+    product_ids = {product_id for product_id, _ in held}
+    sizes = list(ProductSize.objects.filter(product_id__in=product_ids).order_by('id'))
+    for product_size in sizes:
+        product_size.held = held.get((product_size.product_id, product_size.size), 0)
+        product_size.stock_count += product_size.held
+    ProductSize.objects.bulk_update(sizes, ['stock_count', 'held'], batch_size=500)
+
+    totals, in_stock = defaultdict(int), defaultdict(list)
+    for product_size in sizes:
+        totals[product_size.product_id] += max(product_size.stock_count, 0)
+        if product_size.stock_count > 0:
+            in_stock[product_size.product_id].append(product_size.size)
+    products = list(Products.objects.filter(pk__in=product_ids))
+    for product in products:
+        product.total_stock = totals.get(product.pk, 0)
+        product.available_sizes = ', '.join(in_stock.get(product.pk, []))
+    Products.objects.bulk_update(products, ['total_stock', 'available_sizes'], batch_size=500)
+
+
+def move_held_to_stock(apps, schema_editor):
+    ProductSize = apps.get_model('store', 'ProductSize')
+    ProductSize.objects.filter(held__gt=0).update(stock_count=models.F('stock_count') - models.F('held'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productsize',
+            name='held',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(move_holds_to_held, move_held_to_stock),
+    ]
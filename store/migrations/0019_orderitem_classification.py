@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:23
+
+from django.db import migrations, models
+
+
+def backfill_classification(apps, schema_editor):
+    # The best record of past orders is the product's classification today
+    OrderItem = apps.get_model('store', 'OrderItem')
+    Products = apps.get_model('store', 'Products')
+    OrderItem.objects.update(classification=models.Subquery(
+        Products.objects.filter(pk=models.OuterRef('product_id')).values('classification')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_productsize_held'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='classification',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_classification, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models, transaction
+from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 
@@ -21,9 +22,38 @@ class Products(models.Model):
     image = models.ImageField(upload_to='products/', blank=True, null=True)
     classification = models.CharField(choices=classifications, max_length=12)
     best_seller = models.BooleanField(default=False, null=True, blank=True)
+    # Maintained from ProductSize by store.utils.stock_totals; repair drift
+    # with `manage.py reconcile_stock_totals`
+    total_stock = models.IntegerField(default=0, editable=False, db_index=True)
+    available_sizes = models.CharField(max_length=100, blank=True, default='', editable=False)
+    # Resized copies of `image`, filled in by store.utils.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        # Storefront sections page through products by id within a section
+        indexes = [
+            models.Index(fields=['classification', 'id'], name='products_section_idx'),
+            models.Index(fields=['best_seller', 'id'], name='products_best_seller_idx'),
+        ]
 
     def __str__(self):
         return f"{self.classification} - {self.name} - {self.price}"
+
+    def _srcset(self, fmt):
+        if self.image_variants.get("source") != (self.image.name if self.image else None):
+            return ""
+        return ", ".join(
+            f"{self.image.storage.url(name)} {width}w"
+            for width, name in self.image_variants.get(fmt, {}).items()
+        )
+
+    @property
+    def webp_srcset(self):
+        return self._srcset("webp")
+
+    @property
+    def jpeg_srcset(self):
+        return self._srcset("jpeg")
     
 
 class ProductSize(models.Model):
@@ -48,7 +78,11 @@ class ProductSize(models.Model):
 
     product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name='productsizes')
     size = models.CharField(max_length=12, choices=SIZE_CHOICES)
+    # Units on the shelf. Units sitting in carts are counted in `held`
+    # (see store.utils.holds), so admin edits and imports of stock_count
+    # never interact with holds; what can still be sold is `available`.
     stock_count = models.IntegerField(default=0)
+    held = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         unique_together = ['product', 'size']
@@ -60,6 +94,19 @@ class ProductSize(models.Model):
     def is_in_stock(self):
         return self.stock_count > 0
 
+    @property
+    def available(self):
+        return max(self.stock_count - self.held, 0)
+
+    def save(self, **kwargs):
+        # `held` is only ever changed by store.utils.holds with UPDATEs; an
+        # instance read earlier (an admin form, say) must not write it back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields if not field.primary_key and field.name != 'held'
+            ]
+        super().save(**kwargs)
+
 class Order(models.Model):
 
     STATUS_CHOICES = [
@@ -82,22 +129,42 @@ class Order(models.Model):
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Whether the order's lines are currently included in the sales rollups;
+    # kept by store.utils.sales so each change is applied exactly once
+    sales_counted = models.BooleanField(default=False, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        # Access paths of the order changelist: its default ordering and
+        # date_hierarchy, each list_filter combined with that ordering, and
+        # search by whole phone number (see OrderAdmin.get_search_results)
+        indexes = [
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['area', 'created_at'], name='order_area_created_idx'),
+            models.Index(fields=['phone'], name='order_phone_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.order_number}"
     
     def save(self, *args, **kwargs):
         if not self.order_number:
-            with transaction.atomic():
-                last = Order.objects.select_for_update().order_by('-id').first()
-                last_num = int(last.order_number) if (last and str(last.order_number).isdigit()) else 0
-                self.order_number = str(last_num + 1)
+            from .utils.order_numbers import allocate_order_number
+            self.order_number = allocate_order_number()
         super().save(*args, **kwargs)
 
 
+class OrderNumberCounter(models.Model):
+    # One row per sequence; numbers are handed out by bumping `value`
+    # instead of scanning and locking the Order table.
+    name = models.CharField(max_length=30, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Products, on_delete=models.CASCADE)
@@ -111,6 +178,14 @@ class OrderItem(models.Model):
     ])
     quantity = models.PositiveIntegerField(default=1)
     price = models.IntegerField()
+    # The product's classification when ordered, so the sales rollups can
+    # take the line back out under the same key after a reclassification
+    classification = models.CharField(max_length=12, blank=True, default='', editable=False)
+
+    def save(self, *args, **kwargs):
+        if not self.classification:
+            self.classification = self.product.classification
+        super().save(*args, **kwargs)
 
     def __str__(self):
         size_text = f" ({self.get_size_display()})" if self.size else ""
@@ -119,4 +194,79 @@ class OrderItem(models.Model):
     @property
     def total_price(self):
         return self.quantity * self.price
-    
\ No newline at end of file
+    
+
+class StockHold(models.Model):
+    # Units reserved for a cart, counted in ProductSize.held while it lasts.
+    # place_order converts them into the order; expired holds are given back
+    # by store.utils.holds.release_expired_holds().
+    product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name='holds')
+    size = models.CharField(max_length=12)
+    cart_token = models.CharField(max_length=32)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ['cart_token', 'product', 'size']
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} ({self.size}) until {self.expires_at:%H:%M}"
+
+
+class StockAlertSummary(models.Model):
+    # Single row holding what the admin stock banner shows, rebuilt by
+    # store.utils.stock_alerts when stock changes instead of on every page.
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stock alerts as of {self.updated_at:%Y-%m-%d %H:%M}"
+
+
+class CatalogVersion(models.Model):
+    # Single row bumped after every Products/ProductSize write (see
+    # store.utils.catalog_version); storefront ETags and Last-Modified
+    # headers are derived from it so unchanged pages can be answered with 304.
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Catalog v{self.version} ({self.updated_at:%Y-%m-%d %H:%M})"
+
+
+class DailyProductSales(models.Model):
+    # Units and revenue per day, product and size, and (below) per day and
+    # delivery area, maintained by store.utils.sales as orders are placed
+    # and cancelled so sales reports never scan the order history. Each
+    # table is bounded by days x catalog (or areas), not by order volume.
+    # Rebuild with `manage.py rebuild_sales_rollup`.
+    day = models.DateField()
+    product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name='daily_sales')
+    size = models.CharField(max_length=12, blank=True, default='')
+    # The product's classification when the row was created
+    classification = models.CharField(max_length=12)
+    units = models.IntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['day', 'product', 'size']
+        # Its admin page is the sales dashboard
+        verbose_name_plural = 'daily sales'
+
+    def __str__(self):
+        return f"{self.day}: {self.units} x {self.product_id} ({self.size or '-'})"
+
+
+class DailyAreaSales(models.Model):
+    day = models.DateField()
+    area = models.CharField(max_length=50)
+    classification = models.CharField(max_length=12)
+    units = models.IntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['day', 'area', 'classification']
+        verbose_name_plural = 'daily area sales'
+
+    def __str__(self):
+        return f"{self.day}: {self.units} to {self.area} ({self.classification})"
@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CatalogCursorPagination(CursorPagination):
+    # Cursor pages stay stable while products are added and cost an indexed
+    # range scan instead of OFFSET on deep pages.
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
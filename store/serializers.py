@@ -0,0 +1,50 @@
+from rest_framework import serializers
+
+from .models import Products, ProductSize
+
+
+class SparseFieldsMixin:
+    """
+    Lets clients ask for a subset of fields with ?fields=id,name,price.
+    Unknown names are ignored; an empty selection keeps every field.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request else None
+        if requested:
+            wanted = {name.strip() for name in requested.split(',') if name.strip()}
+            if wanted & set(self.fields):
+                for name in set(self.fields) - wanted:
+                    self.fields.pop(name)
+
+
+# Stock goes out as in/out flags only: exact counts are nobody's business
+# outside the admin and would let anyone watch sales size by size
+class ProductSizeSerializer(serializers.ModelSerializer):
+    size_display = serializers.CharField(source='get_size_display', read_only=True)
+    in_stock = serializers.BooleanField(source='is_in_stock', read_only=True)
+
+    class Meta:
+        model = ProductSize
+        fields = ['size', 'size_display', 'in_stock']
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    image = serializers.SerializerMethodField()
+    in_stock = serializers.SerializerMethodField()
+    sizes = ProductSizeSerializer(source='productsizes', many=True, read_only=True)
+
+    class Meta:
+        model = Products
+        fields = [
+            'id', 'name', 'price', 'compare_price', 'classification', 'best_seller',
+            'image', 'available_sizes', 'in_stock', 'sizes',
+        ]
+
+    def get_image(self, obj):
+        return obj.image.url if obj.image else None
+
+    def get_in_stock(self, obj):
+        return obj.total_stock > 0
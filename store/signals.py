@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from .models import Order, Products, ProductSize
+from .utils.catalog_version import schedule_catalog_bump
+from .utils.images import refresh_image_variants
+from .utils.stock_alerts import schedule_stock_alert_invalidation
+from .utils.sales import remove_order_sales, schedule_sales_sync
+from .utils.search import search_index
+from .utils.stock_index import stock_index
+from .utils.stock_totals import refresh_stock_totals
+
+# Sent with `product_ids` whenever ProductSize stock changes. Model saves
+# send it automatically; code that changes stock with queryset.update() or
+# bulk operations (which skip model signals) must send it itself.
+stock_changed = Signal()
+
+# Sent with `product_ids` when cart holds change ProductSize.held. Held
+# units are still on the shelf, so only free-stock lookups care.
+holds_changed = Signal()
+
+
+@receiver(post_save, sender=ProductSize)
+@receiver(post_delete, sender=ProductSize)
+def product_size_changed(sender, instance, **kwargs):
+    stock_changed.send(sender=ProductSize, product_ids={instance.product_id})
+
+
+@receiver(post_save, sender=Products)
+def product_created(sender, instance, created, **kwargs):
+    if created:
+        # Primary keys can be reused, so never trust an old index entry
+        stock_index.invalidate({instance.pk})
+
+
+@receiver(post_save, sender=Products)
+def product_image_changed(sender, instance, **kwargs):
+    if not getattr(settings, "PRODUCT_IMAGE_VARIANTS_ON_SAVE", True):
+        return
+    if instance.image and instance.image_variants.get("source") != instance.image.name:
+        transaction.on_commit(lambda: refresh_image_variants([instance]))
+
+
+@receiver(post_save, sender=Products)
+@receiver(post_delete, sender=Products)
+def product_changed(sender, instance, **kwargs):
+    # Names and out-of-stock products appear in the admin stock banner
+    schedule_stock_alert_invalidation({instance.pk})
+    schedule_catalog_bump()
+    invalidate_search({instance.pk})
+
+
+@receiver(stock_changed)
+def refresh_product_stock_totals(sender, product_ids, **kwargs):
+    # Same transaction as the stock change, so the columns never drift
+    refresh_stock_totals(product_ids)
+
+
+@receiver(stock_changed)
+def invalidate_stock_alerts_summary(sender, product_ids, **kwargs):
+    schedule_stock_alert_invalidation(product_ids)
+
+
+@receiver(stock_changed)
+@receiver(holds_changed)
+def refresh_stock_index(sender, product_ids, **kwargs):
+    # Drop the entries now so this request reads its own writes, and again
+    # on commit so other requests never keep a pre-commit snapshot.
+    stock_index.invalidate(product_ids)
+    transaction.on_commit(lambda: stock_index.invalidate(product_ids))
+
+
+@receiver(stock_changed)
+def bump_catalog_version(sender, product_ids, **kwargs):
+    # Storefront pages show stock, so they change with it. Cart holds send
+    # holds_changed instead, so cart clicks never invalidate cached pages.
+    schedule_catalog_bump()
+
+
+@receiver(stock_changed)
+def refresh_search_index(sender, product_ids, **kwargs):
+    # In-stock sizes are searchable
+    invalidate_search(product_ids)
+
+
+def invalidate_search(product_ids):
+    # As for the stock index: now for this request, again once committed
+    search_index.invalidate(product_ids)
+    transaction.on_commit(lambda: search_index.invalidate(product_ids))
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    # New orders (once their lines are committed) and status changes reach
+    # the sales rollup; saves that change neither are no-ops there
+    schedule_sales_sync([instance.pk])
+
+
+@receiver(pre_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    # Now, while the order's lines still exist
+    remove_order_sales(instance.pk)
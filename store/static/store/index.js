@@ -72,7 +72,6 @@ document.addEventListener("DOMContentLoaded", () => {
         const cartItemsContainer = document.getElementById('checkoutCartItems');
         const subtotalEl = document.getElementById('checkoutSubtotal');
         const totalEl = document.getElementById('checkoutTotal');
-        const totalAmountInput = document.getElementById('total_amount');
         const addMore = document.getElementById('add-more');
         
         // Check if cartAPI exists and has items
@@ -86,18 +85,17 @@ document.addEventListener("DOMContentLoaded", () => {
             `;
             subtotalEl.textContent = '0 EGP';
             totalEl.textContent = '0 EGP';
-            totalAmountInput.value = '0';
             document.getElementById('placeOrderBtn').disabled = true;
             return;
         }
 
         const cart = window.cartAPI.cart;
         let itemsHTML = '';
-        let subtotal = 0;
+        // Totals are maintained server-side on every cart change
+        const subtotal = window.cartAPI.getCartTotal();
 
         cart.items.forEach(item => {
-            const itemTotal = parseFloat(item.unit_price) * item.qty;
-            subtotal += itemTotal;
+            const itemTotal = item.line_total;
             
             itemsHTML += `
                 <div class="checkout-cart-item">
@@ -123,7 +121,6 @@ document.addEventListener("DOMContentLoaded", () => {
         cartItemsContainer.innerHTML = itemsHTML;
         subtotalEl.textContent = `${subtotal} EGP`;
         totalEl.textContent = `${subtotal} EGP`;
-        totalAmountInput.value = Math.round(subtotal); // Convert to integer for backend
         
         // Enable order button if cart has items
         document.getElementById('placeOrderBtn').disabled = false;
@@ -397,9 +394,7 @@ class CartAPI {
 
     // Get cart total
     getCartTotal() {
-        return this.cart.items.reduce((total, item) => {
-            return total + (parseFloat(item.unit_price) * item.qty);
-        }, 0);
+        return this.cart.subtotal || 0;
     }
 }
 
@@ -1,3 +1,1280 @@
-from django.test import TestCase
+import csv
+import io
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DailyAreaSales, DailyProductSales, Order, OrderItem, OrderNumberCounter, Products, ProductSize, StockHold
+from .signals import stock_changed
+from .utils.cart import Cart, CartMiddleware, SessionCartStorage, get_cart, save_cart
+from .utils.holds import place_hold, release_expired_holds
+from .utils.stock_alerts import get_stock_alerts, refresh_stock_alerts
+from .utils.search import search_index
+from .utils.stock_index import stock_index
+from .utils.order_numbers import allocate_order_number, reset_block
+from .utils.catalog_version import bump_catalog_version, get_catalog_version
+from .utils.db import atomic_with_retry
+from .utils.perf import metrics
+from .utils.staticfiles import minify_css, minify_js, serve_static
+
+
+def make_product(name, classification='tshirts', price=500, sizes=None, **kwargs):
+    product = Products.objects.create(name=name, classification=classification, price=price, **kwargs)
+    for size, stock in (sizes or {}).items():
+        ProductSize.objects.create(product=product, size=size, stock_count=stock)
+    return product
+
+
+class ProductsPageTests(TestCase):
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('products'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        make_product('Tee 0', sizes={'M': 3, 'L': 0})
+        self.client.get(reverse('products'))  # sets the CSRF cookie
+        stock_index.invalidate()
+        small = self.count_queries()
+
+        classifications = ['tshirts', 'shorts', 'suit', 'trouser']
+        for i in range(1, 40):
+            make_product(
+                f'Item {i}',
+                classification=classifications[i % 4],
+                best_seller=(i % 5 == 0),
+                sizes={'S': i % 3, 'M': 2, 'XL': 0},
+            )
+        large = self.count_queries()
+
+        self.assertEqual(small, large)
+
+    def test_sizes_render_with_stock_state(self):
+        make_product('Tee', sizes={'M': 3, 'L': 0})
+        response = self.client.get(reverse('products'))
+        self.assertContains(response, '<option value="M">')
+        self.assertContains(response, 'Large (Out of stock)')
+
+    def test_sections_render_a_first_page_and_load_the_rest(self):
+        for i in range(5):
+            make_product(f'Tee {i}', sizes={'M': 1})
+        make_product('Short', classification='shorts', best_seller=True)
+
+        with self.settings(CATALOG_SECTION_SIZE=2):
+            response = self.client.get(reverse('products'))
+            sections = {s['slug']: s for s in response.context['sections']}
+            self.assertEqual(list(sections), ['best-sellers', 'tshirts', 'shorts'])
+            self.assertEqual([p.name for p in sections['tshirts']['products']], ['Tee 0', 'Tee 1'])
+            self.assertIsNone(sections['shorts']['next_after'])
+
+            names, after = [], sections['tshirts']['next_after']
+            while after:
+                response = self.client.get(reverse('product_section', args=['tshirts']), {'after': after})
+                names += [p.name for p in response.context['products']]
+                after = response['X-Next-After']
+            self.assertEqual(names, ['Tee 2', 'Tee 3', 'Tee 4'])
+            self.assertContains(response, '<option value="M">')
+
+        self.assertEqual(self.client.get(reverse('product_section', args=['hats'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('product_section', args=['tshirts']), {'after': 'x'}).status_code, 400)
+
+
+def make_order(**kwargs):
+    fields = dict(first_name='Test', phone='01000000000', address='1 Test St', area='Cairo',
+                  nearest_landmark='', total_amount=0)
+    fields.update(kwargs)
+    return Order.objects.create(**fields)
+
+
+class OrderNumberTests(TestCase):
+
+    def setUp(self):
+        reset_block()
+
+    def test_numbers_are_sequential(self):
+        first, second = make_order(), make_order()
+        self.assertEqual(int(second.order_number), int(first.order_number) + 1)
+
+    def test_counter_seeds_from_existing_orders(self):
+        OrderNumberCounter.objects.all().delete()
+        make_order(order_number='41')
+        self.assertEqual(allocate_order_number(), '42')
+
+    def test_block_reservation(self):
+        with self.settings(ORDER_NUMBER_BLOCK_SIZE=10):
+            numbers = [int(allocate_order_number()) for _ in range(12)]
+        reset_block()
+        self.assertEqual(numbers, sorted(set(numbers)))
+        self.assertEqual(OrderNumberCounter.objects.get(name='order').value, numbers[0] + 19)
+
+
+CHECKOUT_FORM = {
+    'first_name': 'Test', 'phone': '01000000000', 'address': '1 Test St', 'area': 'Cairo',
+    'nearest_landmark': '', 'notes': '', 'total_amount': '0',
+}
+
+
+class PlaceOrderTests(TestCase):
+
+    def set_cart(self, items):
+        session = self.client.session
+        session['cart'] = {'items': items}
+        session.save()
+
+    def line(self, product, size, qty):
+        return {'product_id': product.pk, 'name': product.name, 'qty': qty,
+                'unit_price': str(product.price), 'image_url': '', 'size': size}
+
+    def test_order_decrements_stock_in_bulk(self):
+        tee = make_product('Tee', sizes={'M': 5, 'L': 1})
+        self.set_cart([self.line(tee, 'M', 2), self.line(tee, 'L', 1)])
+
+        response = self.client.post(reverse('place_order'), dict(CHECKOUT_FORM, total_amount='1'))
+
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, 1500)
+        self.assertRedirects(response, reverse('order_success', args=[order.order_number]),
+                             fetch_redirect_response=False)
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 2)
+        stock = dict(ProductSize.objects.values_list('size', 'stock_count'))
+        self.assertEqual(stock, {'M': 3, 'L': 0})
+
+    def test_insufficient_stock_rolls_back(self):
+        tee = make_product('Tee', sizes={'M': 5, 'L': 1})
+        self.set_cart([self.line(tee, 'M', 2), self.line(tee, 'L', 3)])
+
+        response = self.client.post(reverse('place_order'), CHECKOUT_FORM)
+
+        self.assertRedirects(response, reverse('checkout'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(ProductSize.objects.get(size='M').stock_count, 5)
+
+    def test_query_count_does_not_grow_with_cart(self):
+        def place(lines):
+            self.set_cart(lines)
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(reverse('place_order'), CHECKOUT_FORM)
+            return len(ctx.captured_queries)
+
+        products = [make_product(f'Tee {i}', sizes={'M': 10, 'L': 10}) for i in range(6)]
+        small = place([self.line(products[0], 'M', 1)])
+        large = place([self.line(p, size, 2) for p in products for size in ('M', 'L')])
+        self.assertEqual(small, large)
+
+    def test_database_busy_gets_its_own_message(self):
+        tee = make_product('Tee', sizes={'M': 5})
+        self.set_cart([self.line(tee, 'M', 1)])
+        with mock.patch('store.views.create_order_items', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('store.views', 'ERROR'):
+            response = self.client.post(reverse('place_order'), CHECKOUT_FORM, follow=True)
+        self.assertIn('very busy', ' '.join(str(m) for m in response.context['messages']))
+        self.assertFalse(Order.objects.exists())
+
+    def test_other_database_errors_get_the_generic_message(self):
+        tee = make_product('Tee', sizes={'M': 5})
+        self.set_cart([self.line(tee, 'M', 1)])
+        with mock.patch('store.views.create_order_items', side_effect=OperationalError('no such table: store_orderitem')), \
+                self.assertLogs('store.views', 'ERROR'):
+            response = self.client.post(reverse('place_order'), CHECKOUT_FORM, follow=True)
+        text = ' '.join(str(m) for m in response.context['messages'])
+        self.assertNotIn('very busy', text)
+        self.assertIn('An error occurred', text)
+
+
+class DatabaseRetryTests(TransactionTestCase):
+
+    def test_sqlite_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 20000)
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_transient_lock_errors_are_retried(self):
+        calls = []
+
+        def checkout():
+            calls.append(1)
+            Products.objects.create(name=f'Try {len(calls)}', classification='tshirts', price=1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return len(calls)
+
+        self.assertEqual(atomic_with_retry(checkout, delay=0), 3)
+        # Failed attempts were rolled back
+        self.assertEqual(list(Products.objects.values_list('name', flat=True)), ['Try 3'])
+
+    def test_other_errors_and_exhausted_retries_are_raised(self):
+        with self.assertRaises(IntegrityError):
+            atomic_with_retry(mock.Mock(side_effect=IntegrityError('duplicate')), delay=0)
+
+        failing = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError):
+            atomic_with_retry(failing, attempts=2, delay=0)
+        self.assertEqual(failing.call_count, 2)
+
+
+class CartPricingTests(TestCase):
+
+    def post(self, name, **data):
+        return self.client.post(reverse(name), data).json()['cart']
+
+    def test_totals_follow_add_and_remove(self):
+        tee = make_product('Tee', price=300, sizes={'M': 5})
+        shorts = make_product('Shorts', classification='shorts', price=450)
+
+        self.post('add_to_cart', product_id=tee.pk, size='M', qty=2)
+        cart = self.post('add_to_cart', product_id=shorts.pk)
+        self.assertEqual(cart['subtotal'], 1050)
+
+        # Price changes after a line is in the cart do not re-price it
+        Products.objects.filter(pk=tee.pk).update(price=999)
+        cart = self.post('add_to_cart', product_id=tee.pk, size='M')
+        self.assertEqual(cart['subtotal'], 1350)
+
+        cart = self.post('remove_from_cart', product_id=tee.pk, size='M')
+        self.assertEqual([item['line_total'] for item in cart['items']], [600, 450])
+        self.assertEqual(cart['subtotal'], 1050)
+
+    def test_legacy_cart_is_priced_on_read(self):
+        session = self.client.session
+        session['cart'] = {'items': [{'product_id': 1, 'name': 'Tee', 'qty': 3, 'unit_price': '200', 'image_url': ''}]}
+        session.save()
+        response = self.client.get(reverse('checkout'))
+        self.assertEqual(response.context['cart']['subtotal'], 600)
+
+    def test_legacy_cart_migrates_to_keyed_format(self):
+        tee = make_product('Tee', price=200, sizes={'M': 5})
+        session = self.client.session
+        session['cart'] = {'items': [
+            {'product_id': tee.pk, 'name': 'Tee', 'qty': 1, 'unit_price': '200', 'image_url': '',
+             'size': 'M', 'size_display': 'Medium'},
+            {'product_id': tee.pk, 'name': 'Tee', 'qty': 2, 'unit_price': '200', 'image_url': ''},
+        ]}
+        session.save()
+
+        response = self.client.get(reverse('checkout'))
+
+        stored = self.client.session['cart']
+        self.assertEqual(stored, {'v': 2, 'lines': {f'{tee.pk}:M': [1, 200], f'{tee.pk}:': [2, 200]}, 'subtotal': 600})
+        items = response.context['cart']['items']
+        self.assertEqual(items[0]['size_display'], 'Medium')
+        self.assertEqual(items[1]['name'], 'Tee')
+        self.assertNotIn('size', items[1])
+
+
+class CartStorageTests(TestCase):
+
+    def round_trip(self):
+        tee = make_product('Tee', price=300, sizes={'M': 5})
+        self.client.post(reverse('add_to_cart'), {'product_id': tee.pk, 'size': 'M'})
+        cart = self.client.post(reverse('add_to_cart'), {'product_id': tee.pk, 'size': 'M'}).json()['cart']
+        self.assertEqual(cart['subtotal'], 600)
+        response = self.client.get(reverse('checkout'))
+        self.assertEqual(response.context['cart']['items'][0]['qty'], 2)
+
+    def test_session_storage(self):
+        self.round_trip()
+        self.assertIn('cart', self.client.session)
+
+    def test_cache_storage(self):
+        with self.settings(CART_STORAGE='cache', CART_CACHE_ALIAS='default'):
+            self.round_trip()
+        self.assertIn('cart_id', self.client.cookies)
+        self.assertNotIn('cart', self.client.session)
+
+    def test_cookie_storage(self):
+        with self.settings(CART_STORAGE='cookie'):
+            self.round_trip()
+        self.assertIn('cart', self.client.cookies)
+        self.assertNotIn('cart', self.client.session)
+
+    def test_mutations_are_written_once_per_request(self):
+        def view(request):
+            for _ in range(3):
+                cart = get_cart(request)
+                cart.add(1, 1, 100, 'M')
+                save_cart(request, cart)
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        with mock.patch.object(SessionCartStorage, 'save') as save:
+            CartMiddleware(view)(request)
+        save.assert_called_once()
+        self.assertEqual(save.call_args.args[2]['lines'], {'1:M': [3, 100]})
+
+    async def test_async_cart_views_with_every_storage(self):
+        tee = await sync_to_async(make_product)('Tee', price=300, sizes={'M': 5})
+        for storage in ('session', 'cache', 'cookie'):
+            with self.subTest(storage=storage), self.settings(CART_STORAGE=storage, CART_CACHE_ALIAS='default'):
+                client = AsyncClient()
+                await client.post(reverse('add_to_cart'), {'product_id': tee.pk, 'size': 'M'})
+                await client.post(reverse('add_to_cart'), {'product_id': tee.pk, 'size': 'M'})
+                cart = (await client.post(reverse('remove_from_cart'), {'product_id': tee.pk, 'size': 'M'})).json()['cart']
+                self.assertEqual(cart['subtotal'], 300)
+
+                summary = (await client.get(reverse('cart_summary'))).json()['cart']
+                self.assertEqual(summary['items'][0]['name'], 'Tee')
+                self.assertEqual(summary['items'][0]['qty'], 1)
+
+
+class StockIndexTests(TestCase):
+
+    def test_add_to_cart_reads_stock_from_index(self):
+        tee = make_product('Tee', sizes={'M': 2})
+        stock_index.sizes(tee.pk)  # warm
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('add_to_cart'), {'product_id': tee.pk, 'size': 'M', 'qty': 3})
+        self.assertEqual(response.json()['error'], 'Only 2 items available in size M')
+        self.assertFalse([q for q in ctx.captured_queries if 'store_productsize' in q['sql']])
+
+        response = self.client.post(reverse('add_to_cart'), {'product_id': tee.pk, 'size': 'XL'})
+        self.assertEqual(response.json()['error'], 'This size is not available')
+
+    def test_index_follows_stock_changes(self):
+        tee = make_product('Tee', sizes={'M': 2})
+        self.assertEqual(stock_index.stock(tee.pk, 'M'), 2)
+
+        ProductSize.objects.filter(product=tee).update(stock_count=9)
+        self.assertEqual(stock_index.stock(tee.pk, 'M'), 2)  # bulk update without notification
+
+        size = ProductSize.objects.get(product=tee)
+        size.stock_count = 4
+        size.save()
+        self.assertEqual(stock_index.stock(tee.pk, 'M'), 4)
+
+        session = self.client.session
+        session['cart'] = {'v': 2, 'lines': {f'{tee.pk}:M': [3, 500]}, 'subtotal': 1500}
+        session.save()
+        self.client.post(reverse('place_order'), CHECKOUT_FORM)
+        self.assertEqual(stock_index.stock(tee.pk, 'M'), 1)
+
+    def test_readers_keep_the_old_copy_while_it_reloads(self):
+        from .utils.stock_index import StockIndex
+        tee = make_product('Tee', sizes={'M': 2, 'L': 1})
+        index = StockIndex()
+        self.assertEqual(index.stock(tee.pk, 'M'), 2)
+        ProductSize.objects.filter(product=tee, size='M').update(stock_count=7)
+
+        seen = []
+        fetch = index._fetch
+
+        def fetch_and_peek(product_ids=None):
+            # What a lock-free astock() in another thread reads meanwhile
+            seen.append((index._index[1].get((tee.pk, 'M')), len(index._index[0].get(tee.pk, []))))
+            return fetch(product_ids)
+
+        with mock.patch.object(index, '_fetch', fetch_and_peek):
+            index.invalidate()
+            self.assertEqual(index.stock(tee.pk, 'M'), 7)
+            index.invalidate({tee.pk})
+            self.assertEqual(index.stock(tee.pk, 'L'), 1)
+        self.assertEqual(seen, [(2, 2), (7, 2)])
+
+
+class StockHoldTests(TestCase):
+
+    def setUp(self):
+        self.tee = make_product('Tee', price=300, sizes={'M': 3})
+
+    def stock(self):
+        """(stock_count, held) of the Tee in M."""
+        return tuple(ProductSize.objects.filter(product=self.tee, size='M').values_list('stock_count', 'held').get())
+
+    def add(self, client, qty=1):
+        return client.post(reverse('add_to_cart'), {'product_id': self.tee.pk, 'size': 'M', 'qty': qty}).json()
+
+    def test_adding_holds_stock_and_removing_releases_it(self):
+        self.add(self.client, qty=2)
+        self.assertEqual(self.stock(), (3, 2))
+        self.assertEqual(StockHold.objects.get().quantity, 2)
+
+        self.client.post(reverse('remove_from_cart'), {'product_id': self.tee.pk, 'size': 'M'})
+        self.assertEqual(self.stock(), (3, 1))
+        self.assertEqual(StockHold.objects.get().quantity, 1)
+
+    def test_quantities_below_one_are_rejected(self):
+        self.add(self.client, qty=3)
+        other = self.client_class()
+        for qty in (-3, 0, 'two'):
+            response = other.post(reverse('add_to_cart'), {'product_id': self.tee.pk, 'size': 'M', 'qty': qty})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(), (3, 3))
+        self.assertEqual(StockHold.objects.get().quantity, 3)
+        self.assertFalse(self.add(self.client_class())['ok'])
+
+        with self.assertRaises(ValueError):
+            place_hold('token', self.tee.pk, 'M', -1)
+        with self.assertRaises(ValueError):
+            Cart().add(self.tee.pk, 0, 300, 'M')
+
+    def test_held_stock_is_not_available_to_other_carts(self):
+        self.add(self.client, qty=3)
+        other = self.client_class()
+        self.assertFalse(self.add(other)['ok'])
+
+    def test_expired_holds_are_released(self):
+        self.add(self.client, qty=2)
+        self.assertEqual(release_expired_holds(), 0)
+        self.assertEqual(release_expired_holds(now=timezone.now() + timedelta(hours=1)), 1)
+        self.assertEqual(self.stock(), (3, 0))
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_place_order_converts_holds(self):
+        self.add(self.client, qty=2)
+        self.client.post(reverse('place_order'), CHECKOUT_FORM)
+        self.assertEqual(Order.objects.get().items.get().quantity, 2)
+        self.assertEqual(self.stock(), (1, 0))
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_place_order_after_hold_expired_takes_free_stock(self):
+        self.add(self.client, qty=2)
+        release_expired_holds(now=timezone.now() + timedelta(hours=1))
+        self.client.post(reverse('place_order'), CHECKOUT_FORM)
+        self.assertEqual(self.stock(), (1, 0))
+
+    def test_setting_stock_while_units_are_held_never_counts_them_twice(self):
+        from django.contrib.auth.models import User
+        self.add(self.client, qty=2)
+        # A recount in the admin, then the hold expires
+        admin = self.client_class()
+        admin.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        size = ProductSize.objects.get(product=self.tee, size='M')
+        admin.post(reverse('admin:store_productsize_change', args=[size.pk]), {
+            'product': self.tee.pk, 'size': 'M', 'stock_count': 4,
+        })
+        self.assertEqual(self.stock(), (4, 2))
+        self.assertFalse(self.add(self.client_class(), qty=3)['ok'])
+
+        release_expired_holds(now=timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.stock(), (4, 0))
+        # Held units are still on the shelf, so the banner never lists them
+        self.add(self.client, qty=4)
+        self.assertEqual(refresh_stock_alerts()['zero_sizes']['count'], 0)
+
+
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = self.settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def png(self, size=(800, 800)):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, (200, 30, 30, 255)).save(buffer, 'PNG')
+        return ContentFile(buffer.getvalue(), name='tee.png')
+
+    def test_variants_are_built_when_image_is_saved(self):
+        product = Products(name='Tee', classification='tshirts', price=500)
+        product.image.save('tee.png', self.png(), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        product.refresh_from_db()
+        variants = product.image_variants
+        self.assertEqual(variants['source'], product.image.name)
+        self.assertEqual(sorted(variants['webp']), ['320', '480', '680'])
+        self.assertTrue(all(product.image.storage.exists(name) for name in variants['jpeg'].values()))
+
+        response = self.client.get(reverse('products'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '320w')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_small_images_are_not_upscaled(self):
+        product = Products(name='Tee', classification='tshirts', price=500)
+        product.image.save('tee.png', self.png((400, 300)), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        product.refresh_from_db()
+        self.assertEqual(sorted(product.image_variants['webp']), ['320', '400'])
+
+
+class OrderAdminTests(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.products = [make_product(f'Tee {i}') for i in range(3)]
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = make_order()
+            for i, product in enumerate(self.products):
+                OrderItem.objects.create(order=order, product=product, size='M', quantity=i + 1, price=500)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:store_order_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelist_query_budget(self):
+        self.add_orders(2)
+        small = self.count_queries()
+        self.add_orders(23)
+        full_page = self.count_queries()
+
+        self.assertEqual(small, full_page)
+        self.assertLessEqual(full_page, 10)
+
+    def test_changelist_shows_items(self):
+        self.add_orders(1)
+        response = self.client.get(reverse('admin:store_order_changelist'))
+        self.assertContains(response, '3x Tee 2(M)')
+        self.assertContains(response, '<td class="field-items_count">3</td>', html=True)
+
+    def test_full_phone_number_search_uses_the_phone_index(self):
+        mona = make_order(first_name='Mona', phone='01123456789')
+        make_order(first_name='Sara', phone='01298765432')
+        url = reverse('admin:store_order_changelist')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'q': '01123456789'})
+        self.assertEqual([o.pk for o in response.context['cl'].result_list], [mona.pk])
+        self.assertNotIn('LIKE', ' '.join(q['sql'] for q in ctx.captured_queries if 'store_order' in q['sql']))
+
+        response = self.client.get(url, {'q': 'Sara'})
+        self.assertEqual([o.first_name for o in response.context['cl'].result_list], ['Sara'])
+
+    def test_partial_numbers_match_every_field(self):
+        twelve = make_order(order_number='12', phone='01000000001')
+        hundred_twenty = make_order(order_number='120', phone='01000000002')
+        numbered = make_order(order_number='5678', phone='01000000003')
+        customer = make_order(order_number='777', phone='01198765678')
+        url = reverse('admin:store_order_changelist')
+
+        response = self.client.get(url, {'q': '12'})
+        self.assertEqual({o.pk for o in response.context['cl'].result_list}, {twelve.pk, hundred_twenty.pk})
+
+        # An order number that is also the end of a customer's phone
+        response = self.client.get(url, {'q': '5678'})
+        self.assertEqual({o.pk for o in response.context['cl'].result_list}, {numbered.pk, customer.pk})
+
+    def test_digit_search_falls_back_to_substring_match(self):
+        mona = make_order(first_name='Mona', phone='01123456789', address='4739 Street 9')
+        sara = make_order(first_name='Sara', phone='01298765432', address='5 Road 3')
+        url = reverse('admin:store_order_changelist')
+
+        # The end of a phone number
+        response = self.client.get(url, {'q': '65432'})
+        self.assertEqual([o.pk for o in response.context['cl'].result_list], [sara.pk])
+
+        # A house number
+        response = self.client.get(url, {'q': '4739'})
+        self.assertEqual([o.pk for o in response.context['cl'].result_list], [mona.pk])
+
+
+class StockAlertTests(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def test_banner_reads_the_summary_only(self):
+        make_product('Sold Out', sizes={'M': 0})
+        make_product('Running Low', sizes={'L': 2})
+        refresh_stock_alerts()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/admin/store/')
+        self.assertNotIn('store_productsize', ' '.join(q['sql'] for q in ctx.captured_queries))
+
+        text = ' '.join(str(m) for m in response.context['messages'])
+        self.assertIn('Out of stock products', text)
+        self.assertIn('Sold Out (Medium)', text)
+        self.assertIn('Running Low (Large: 2 left)', text)
+
+    def test_summary_follows_stock_changes(self):
+        tee = make_product('Tee', sizes={'M': 20})
+        refresh_stock_alerts()
+        self.assertEqual(get_stock_alerts()['low_sizes']['count'], 0)
+
+        size = ProductSize.objects.get(product=tee)
+        size.stock_count = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            size.save()
+        self.assertEqual(get_stock_alerts()['low_sizes']['items'][0]['stock'], 3)
+
+        size.stock_count = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            size.save()
+        alerts = get_stock_alerts()
+        self.assertEqual(alerts['low_sizes']['count'], 0)
+        self.assertEqual(alerts['out_of_stock']['items'], [{'product_id': tee.pk, 'name': 'Tee'}])
+
+    def test_checkout_marks_the_summary_stale_without_rebuilding_it(self):
+        tee = make_product('Tee', price=300, sizes={'M': 6})
+        refresh_stock_alerts()
+        session = self.client.session
+        session['cart'] = {'items': [
+            {'product_id': tee.pk, 'name': 'Tee', 'qty': 2, 'unit_price': '300', 'image_url': '', 'size': 'M'},
+        ]}
+        session.save()
+
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('place_order'), CHECKOUT_FORM)
+        sql = [q['sql'] for q in ctx.captured_queries]
+        self.assertTrue(any(q.startswith('DELETE FROM "store_stockalertsummary"') for q in sql))
+        # ... and no catalog scan to write a new one
+        self.assertFalse(any(q.startswith(('INSERT INTO "store_stockalertsummary"', 'UPDATE "store_stockalertsummary"'))
+                             for q in sql))
+
+        # Rebuilt by the next admin page that reads it
+        self.assertEqual(get_stock_alerts()['low_sizes']['items'][0]['stock'], 4)
+
+
+class StockTotalsTests(TestCase):
+
+    def totals(self, product):
+        product.refresh_from_db()
+        return product.total_stock, product.available_sizes
+
+    def test_totals_follow_size_edits_and_orders(self):
+        tee = make_product('Tee', sizes={'S': 0, 'M': 4, 'L': 2})
+        self.assertEqual(self.totals(tee), (6, 'M, L'))
+
+        ProductSize.objects.get(product=tee, size='L').delete()
+        self.assertEqual(self.totals(tee), (4, 'M'))
+
+        session = self.client.session
+        session['cart'] = {'v': 2, 'lines': {f'{tee.pk}:M': [4, 500]}, 'subtotal': 2000}
+        session.save()
+        self.client.post(reverse('place_order'), CHECKOUT_FORM)
+        self.assertEqual(self.totals(tee), (0, ''))
+
+    def test_reconcile_repairs_drift(self):
+        tee = make_product('Tee', sizes={'M': 4})
+        ProductSize.objects.filter(product=tee).update(stock_count=9)
+        Products.objects.filter(pk=tee.pk).update(available_sizes='XL')
+
+        out = io.StringIO()
+        call_command('reconcile_stock_totals', stdout=out)
+        self.assertIn('repaired 1', out.getvalue())
+        self.assertEqual(self.totals(tee), (9, 'M'))
+
+    def test_admin_sorts_and_filters_without_per_row_queries(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        for i in range(12):
+            make_product(f'Tee {i}', sizes={'M': i})
+        refresh_stock_alerts()
+        url = reverse('admin:store_products_changelist')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'o': '6', 'stock': 'low'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('store_productsize', ' '.join(q['sql'] for q in ctx.captured_queries))
+        self.assertEqual([p.total_stock for p in response.context['cl'].result_list], [1, 2, 3, 4, 5])
+
+
+class CatalogApiTests(TestCase):
+
+    def setUp(self):
+        for i in range(5):
+            make_product(f'Tee {i}', sizes={'M': i, 'L': 1})
+
+    def test_cursor_pagination_and_sparse_fields(self):
+        response = self.client.get(reverse('api_products'), {'page_size': 2, 'fields': 'id,name'})
+        data = response.json()
+        self.assertEqual(data['results'][0], {'id': Products.objects.order_by('id')[0].pk, 'name': 'Tee 0'})
+        self.assertIsNone(data['previous'])
+
+        names = [row['name'] for row in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            names += [row['name'] for row in data['results']]
+        self.assertEqual(names, [f'Tee {i}' for i in range(5)])
+
+    def test_sizes_and_stock_flags(self):
+        product = Products.objects.get(name='Tee 0')
+        data = self.client.get(reverse('api_product', args=[product.pk])).json()
+        self.assertEqual(data['sizes'][0], {'size': 'M', 'size_display': 'Medium', 'in_stock': False})
+        self.assertEqual(data['sizes'][1], {'size': 'L', 'size_display': 'Large', 'in_stock': True})
+        self.assertTrue(data['in_stock'])
+        self.assertNotIn('total_stock', data)
+
+    def test_sparse_fields_skip_the_sizes_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('api_products'), {'fields': 'id,price'})
+        self.assertNotIn('store_productsize', ' '.join(q['sql'] for q in ctx.captured_queries))
+
+    def test_conditional_get(self):
+        url = reverse('api_products')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        product = Products.objects.get(name='Tee 1')
+        product.price = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class CatalogVersionTests(TestCase):
+
+    def setUp(self):
+        self.tee = make_product('Tee', sizes={'M': 5})
+        # The first render sets the CSRF cookie the ETag depends on
+        self.client.get(reverse('products'))
+        self.etag = self.client.get(reverse('products'))['ETag']
+
+    def revalidate(self, name='products'):
+        return self.client.get(reverse(name), HTTP_IF_NONE_MATCH=self.etag)
+
+    def test_first_visit_is_always_rendered(self):
+        self.client.cookies.clear()
+        response = self.client.get(reverse('products'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_unchanged_page_is_not_rerendered(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.revalidate()
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('store_products', ' '.join(q['sql'] for q in ctx.captured_queries))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_catalog_writes_bump_the_version(self):
+        version, _ = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductSize.objects.filter(product=self.tee).first().save()
+        self.assertEqual(get_catalog_version()[0], version + 1)
+        self.assertEqual(self.revalidate().status_code, 200)
+
+    def test_cart_changes_the_etag(self):
+        self.client.post(reverse('add_to_cart'), {'product_id': self.tee.pk})
+        self.assertEqual(self.revalidate().status_code, 200)
+
+    def test_holding_sized_stock_leaves_the_version_alone(self):
+        version = get_catalog_version()
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add_to_cart'), {'product_id': self.tee.pk, 'size': 'M', 'qty': 2})
+            self.client.post(reverse('remove_from_cart'), {'product_id': self.tee.pk, 'size': 'M'})
+        self.assertEqual(StockHold.objects.get().quantity, 1)
+        self.assertEqual(get_catalog_version(), version)
+        self.assertNotIn('store_catalogversion', ' '.join(q['sql'] for q in ctx.captured_queries))
+
+    def test_stock_written_by_another_worker_is_not_revalidated_from_a_stale_index(self):
+        # Another process sells out the size: the row changes and the version
+        # moves on, but this process's stock index only sees it after its TTL
+        ProductSize.objects.filter(product=self.tee).update(stock_count=0)
+        bump_catalog_version()
+        response = self.revalidate()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stock_index.stock(self.tee.pk, 'M'), 5)
+        stale = response['ETag']
+
+        stock_index.invalidate()  # the TTL runs out
+        response = self.client.get(reverse('products'), HTTP_IF_NONE_MATCH=stale)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stock_index.stock(self.tee.pk, 'M'), 0)
+        self.assertNotIn('Last-Modified', response)
+
+        # Reloading the same rows, as any other worker would, keeps the ETag
+        stock_index.invalidate()
+        self.assertEqual(self.client.get(reverse('products'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_empty_cart_pages_send_last_modified(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(reverse('home'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post(reverse('add_to_cart'), {'product_id': self.tee.pk})
+        self.assertNotIn('Last-Modified', self.client.get(reverse('home')))
+
+
+class StaticPipelineTests(TestCase):
+
+    def test_minifiers_keep_literals(self):
+        js = "const re = /a \\/ b/g; // trailing\nlet html = `\n  <b>${ x ? `y` : '' }</b>\n`;\nreturn  a  +  +b\n"
+        self.assertEqual(
+            minify_js(js),
+            "const re=/a \\/ b/g;\nlet html=`\n  <b>${ x ? `y` : '' }</b>\n`;\nreturn a+ +b\n",
+        )
+        css = "/* c */ .a :hover ,\n.b > .c {\n  content: ' { ; } ';\n  margin: 0 auto !important;\n}\n"
+        self.assertEqual(minify_css(css), ".a :hover,.b>.c{content:' { ; } ';margin:0 auto!important}\n")
+
+    def test_collectstatic_writes_hashed_minified_and_gzipped_files(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        with self.settings(STATIC_ROOT=root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            from django.contrib.staticfiles.storage import staticfiles_storage
+            hashed = staticfiles_storage.stored_name('store/index.js')
+            self.assertRegex(hashed, r'^store/index\.[0-9a-f]{12}\.js$')
+            with open(f'{root}/store/index.js') as built, open('store/static/store/index.js') as source:
+                self.assertLess(len(built.read()), len(source.read()))
+
+            request = RequestFactory().get('/static/' + hashed, HTTP_ACCEPT_ENCODING='gzip, br')
+            response = serve_static(request, hashed)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/javascript')
+            self.assertIn('immutable', response['Cache-Control'])
+            response.close()
+
+            response = serve_static(RequestFactory().get('/static/store/index.js'), 'store/index.js')
+            self.assertNotIn('Content-Encoding', response)
+            self.assertNotIn('immutable', response['Cache-Control'])
+            response.close()
+
+    def test_uncollected_files_fall_back_to_plain_urls(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '/static/store/index.js')
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        search_index.invalidate()
+        self.navy = make_product('Navy Linen Shirt', price=400, sizes={'M': 2, 'L': 0})
+        self.black = make_product('Black Shirt', price=700, sizes={'L': 3})
+        self.shorts = make_product('Navy Shorts', classification='shorts', price=300, best_seller=True)
+
+    def search(self, **params):
+        response = self.client.get(reverse('api_search'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def names(self, data):
+        return [row['name'] for row in data['results']]
+
+    def test_terms_match_words_and_prefixes(self):
+        self.assertEqual(self.names(self.search(q='navy')), ['Navy Linen Shirt', 'Navy Shorts'])
+        self.assertEqual(self.names(self.search(q='shirt navy')), ['Navy Linen Shirt'])
+        # An exact word ranks above a prefix match
+        self.assertEqual(self.names(self.search(q='shirt')), ['Navy Linen Shirt', 'Black Shirt'])
+        self.assertEqual(self.names(self.search(q='short')), ['Navy Shorts'])
+        self.assertEqual(self.search(q='denim')['count'], 0)
+
+    def test_filters_and_facets(self):
+        data = self.search(size='L', sort='price')
+        self.assertEqual(self.names(data), ['Black Shirt'])
+        self.assertEqual(data['facets']['sizes'], {'L': 1, 'M': 1})
+        self.assertEqual(data['facets']['classification'], {'tshirts': 1})
+
+        data = self.search(min_price=350, max_price=700, sort='-price')
+        self.assertEqual(self.names(data), ['Black Shirt', 'Navy Linen Shirt'])
+        self.assertEqual(data['facets']['price'], {'min': 300, 'max': 700})
+
+        data = self.search(classification='best-sellers')
+        self.assertEqual(self.names(data), ['Navy Shorts'])
+        self.assertEqual(data['facets']['classification'], {'best-sellers': 1, 'shorts': 1, 'tshirts': 2})
+        self.assertEqual(self.search(in_stock=1)['count'], 2)
+
+    def test_changes_are_picked_up_without_a_rebuild(self):
+        self.search()
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductSize.objects.filter(product=self.black, size='L').update(stock_count=0)
+            stock_changed.send(sender=ProductSize, product_ids={self.black.pk})
+            navy = Products.objects.get(pk=self.navy.pk)
+            navy.name = 'Navy Oxford Shirt'
+            navy.save()
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.search(q='oxford', in_stock=1)
+        self.assertEqual(self.names(data), ['Navy Oxford Shirt'])
+        self.assertEqual(self.search(size='L')['count'], 0)
+        self.assertNotIn('store_productsize', ' '.join(q['sql'] for q in ctx.captured_queries))
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(reverse('api_search'), {'min_price': 'cheap'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_search'), {'sort': 'random'}).status_code, 400)
+
+    def test_etag_follows_the_index_rather_than_the_catalog_version(self):
+        url = reverse('api_search')
+        etag = self.client.get(url, {'in_stock': 1})['ETag']
+        # Another process sells out the Black Shirt; this index has not seen it
+        Products.objects.filter(pk=self.black.pk).update(total_stock=0)
+        bump_catalog_version()
+        self.assertEqual(self.client.get(url, {'in_stock': 1}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        search_index.invalidate()  # the TTL runs out
+        response = self.client.get(url, {'in_stock': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Black Shirt', self.names(response.json()))
+
+    def test_searches_keep_the_old_snapshot_while_it_rebuilds(self):
+        from .utils.search import SearchIndex
+        index = SearchIndex()
+        self.assertEqual(index.search(query='navy')['count'], 2)
+        Products.objects.filter(pk=self.black.pk).update(name='Navy Black Shirt')
+
+        seen = []
+        fetch = index._fetch
+
+        def fetch_and_peek(product_ids=None):
+            # What a search in another thread reads meanwhile
+            seen.append(len(index._snapshot.postings['navy']))
+            return fetch(product_ids)
+
+        with mock.patch.object(index, '_fetch', fetch_and_peek):
+            index.invalidate({self.black.pk})
+            self.assertEqual(index.search(query='navy')['count'], 3)
+            index.invalidate()
+            self.assertEqual(index.search(query='navy')['count'], 3)
+        self.assertEqual(seen, [2, 3])
+
+
+class SeedStoreTests(TestCase):
+
+    def setUp(self):
+        reset_block()
+
+    def test_seeds_catalog_and_order_history(self):
+        out = io.StringIO()
+        call_command('seed_store', products=30, orders=40, days=90, stdout=out)
+        self.assertIn('Seeded 30 products', out.getvalue())
+
+        self.assertEqual(Products.objects.count(), 30)
+        self.assertEqual(Order.objects.count(), 40)
+        self.assertTrue(OrderItem.objects.exists())
+        # Stock columns were maintained despite the bulk writes
+        product = Products.objects.filter(productsizes__stock_count__gt=0).distinct().first()
+        self.assertEqual(product.total_stock, sum(product.productsizes.values_list('stock_count', flat=True)))
+
+        oldest = Order.objects.order_by('created_at').first().created_at
+        self.assertLess(oldest, timezone.now() - timedelta(days=80))
+        self.assertEqual(sorted(int(n) for n in Order.objects.values_list('order_number', flat=True)), list(range(1, 41)))
+        self.assertEqual(allocate_order_number(), '41')
+
+
+class BenchCommandTests(SimpleTestCase):
+
+    def test_admin_index_benchmark_runs(self):
+        # In a child process: the command swaps the default database for a
+        # scratch file, which the in-memory test database would not survive
+        result = subprocess.run(
+            [sys.executable, 'manage.py', 'bench_admin_indexes', '--orders', '20', '--repeat', '1'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('Seeded 20 orders', result.stdout)
+
+
+@override_settings(PERF_SERVER_TIMING=True)
+class PerformanceMetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def timing(self, response):
+        return dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+
+    def test_server_timing_breaks_down_the_request(self):
+        make_product('Tee', sizes={'M': 3})
+        timing = self.timing(self.client.get(reverse('products')))
+        self.assertEqual(set(timing), {'total', 'db', 'tpl', 'session'})
+        self.assertRegex(timing['db'], r'desc="[1-9]\d* queries"')
+        self.assertNotEqual(timing['tpl'], 'dur=0.0')
+
+    async def test_async_views_count_their_queries(self):
+        tee = await sync_to_async(make_product)('Tee', sizes={'M': 3})
+        client = AsyncClient()
+        await client.post(reverse('add_to_cart'), {'product_id': tee.pk, 'size': 'M'})
+        timing = self.timing(await client.get(reverse('cart_summary')))
+        self.assertRegex(timing['db'], r'desc="[1-9]\d* queries"')
+        self.assertNotEqual(timing['session'], 'dur=0.0')
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('home'))
+        with self.settings(PERF_SAMPLE_RATE=0):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(set(self.timing(response)), {'total'})
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('hunters_http_requests_total{route="home",method="GET",status="200"} 2', body)
+        self.assertIn('hunters_http_request_duration_seconds_count{route="home"} 2', body)
+        # Only the sampled request has a breakdown
+        self.assertIn('hunters_http_request_queries_count{route="home"} 1', body)
+        self.assertIn('hunters_http_request_phase_seconds_count{route="home",phase="template"} 1', body)
+
+    def test_server_timing_is_only_shown_to_staff_and_allowed_ips(self):
+        from django.contrib.auth.models import User
+        outside = {'REMOTE_ADDR': '203.0.113.7'}
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home'), **outside))
+        with self.settings(PERF_SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('home')))
+
+        self.client.force_login(User.objects.create_user('shopper', password='pw'))
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home'), **outside))
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.assertIn('Server-Timing', self.client.get(reverse('home'), **outside))
+
+    def test_metrics_require_the_token(self):
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 404)
+
+
+class OrderExportTests(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        tee = make_product('Tee', price=300)
+        shorts = make_product('Shorts', classification='shorts', price=200)
+        self.pending = make_order(first_name='Mona', status='pending', notes='=HYPERLINK("x")')
+        OrderItem.objects.create(order=self.pending, product=tee, size='M', quantity=2, price=300)
+        OrderItem.objects.create(order=self.pending, product=shorts, size='L', quantity=1, price=200)
+        self.shipped = make_order(first_name='Sara', status='shipped')
+        OrderItem.objects.create(order=self.shipped, product=tee, size='S', quantity=1, price=300)
+
+    def rows(self, response):
+        self.assertTrue(response.streaming)
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def test_export_honours_changelist_filters(self):
+        changelist = reverse('admin:store_order_changelist')
+        self.assertContains(self.client.get(changelist, {'status__exact': 'pending'}),
+                            reverse('admin:store_order_export') + '?status__exact=pending')
+
+        rows = self.rows(self.client.get(reverse('admin:store_order_export'), {'status__exact': 'pending'}))
+        self.assertEqual(rows[0][:3], ['order_number', 'created_at', 'status'])
+        self.assertEqual([(r[3], r[10], r[11], r[12], r[14]) for r in rows[1:]],
+                         [('Mona', 'Tee', 'M', '2', '600'), ('Mona', 'Shorts', 'L', '1', '200')])
+        self.assertEqual(rows[1][8], '\'=HYPERLINK("x")')
+
+    def test_admin_action_streams_selected_orders(self):
+        response = self.client.post(reverse('admin:store_order_changelist'), {
+            'action': 'export_manifest', '_selected_action': [self.shipped.pk],
+        })
+        rows = self.rows(response)
+        self.assertEqual([r[3] for r in rows[1:]], ['Sara'])
+
+    def test_command_reads_orders_in_chunks(self):
+        for i in range(4):
+            make_order(first_name=f'Bulk {i}', status='processing')
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('export_orders', chunk_size=2, stdout=out)
+        rows = list(csv.reader(out.getvalue().splitlines()))
+
+        self.assertEqual([r[3] for r in rows[1:]], ['Mona', 'Mona', 'Bulk 0', 'Bulk 1', 'Bulk 2', 'Bulk 3'])
+        # One item query per chunk of orders, never one for all of them
+        item_queries = [q for q in ctx.captured_queries if 'FROM "store_orderitem"' in q['sql']]
+        self.assertEqual(len(item_queries), 3)
+
+
+class SalesRollupTests(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.tee = make_product('Tee', price=300, sizes={'M': 10})
+        self.shorts = make_product('Shorts', classification='shorts', price=200, sizes={'L': 10})
+
+    def place(self, lines, area='Maadi'):
+        session = self.client.session
+        session['cart'] = {'items': [
+            {'product_id': p.pk, 'name': p.name, 'qty': qty, 'unit_price': str(p.price), 'image_url': '', 'size': size}
+            for p, size, qty in lines
+        ]}
+        session.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('place_order'), dict(CHECKOUT_FORM, area=area))
+        return Order.objects.latest('pk')
+
+    def rollup(self):
+        products = {
+            (row.product.name, row.size): (row.units, row.revenue)
+            for row in DailyProductSales.objects.select_related('product')
+        }
+        areas = {(row.area, row.classification): (row.units, row.revenue) for row in DailyAreaSales.objects.all()}
+        return products, areas
+
+    def test_orders_are_added_as_they_commit(self):
+        self.place([(self.tee, 'M', 2), (self.shorts, 'L', 1)])
+        self.place([(self.tee, 'M', 1)], area='Zamalek')
+        self.place([(self.tee, 'M', 1)])
+
+        self.assertEqual(self.rollup(), (
+            {('Tee', 'M'): (4, 1200), ('Shorts', 'L'): (1, 200)},
+            {('Maadi', 'tshirts'): (3, 900), ('Maadi', 'shorts'): (1, 200), ('Zamalek', 'tshirts'): (1, 300)},
+        ))
+        self.assertEqual(DailyProductSales.objects.get(product=self.shorts).classification, 'shorts')
+
+    def test_cancelling_takes_orders_out_and_back(self):
+        first = self.place([(self.tee, 'M', 2)])
+        second = self.place([(self.tee, 'M', 1)])
+
+        def action(name, *orders):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('admin:store_order_changelist'), {
+                    'action': name, '_selected_action': [order.pk for order in orders],
+                })
+
+        action('mark_cancelled', first)
+        self.assertEqual(self.rollup(), ({('Tee', 'M'): (1, 300)}, {('Maadi', 'tshirts'): (1, 300)}))
+        # Repeating the action changes nothing
+        action('mark_cancelled', first)
+        self.assertEqual(self.rollup(), ({('Tee', 'M'): (1, 300)}, {('Maadi', 'tshirts'): (1, 300)}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = Order.objects.get(pk=second.pk)
+            second.status = 'cancelled'
+            second.save()
+        self.assertEqual(self.rollup(), ({('Tee', 'M'): (0, 0)}, {('Maadi', 'tshirts'): (0, 0)}))
+
+        action('mark_processing', first, second)
+        self.assertEqual(self.rollup(), ({('Tee', 'M'): (3, 900)}, {('Maadi', 'tshirts'): (3, 900)}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.get(pk=first.pk).delete()
+        self.assertEqual(self.rollup(), ({('Tee', 'M'): (1, 300)}, {('Maadi', 'tshirts'): (1, 300)}))
+
+    def test_reclassified_products_leave_with_their_original_classification(self):
+        order = self.place([(self.tee, 'M', 2)])
+        self.assertEqual(order.items.get().classification, 'tshirts')
+        Products.objects.filter(pk=self.tee.pk).update(classification='best-sellers')
+        self.place([(self.tee, 'M', 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'cancelled'
+            order.save()
+        self.assertEqual(self.rollup()[1], {('Maadi', 'tshirts'): (0, 0), ('Maadi', 'best-sellers'): (1, 300)})
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.place([(self.tee, 'M', 2), (self.shorts, 'L', 1)])
+        cancelled = self.place([(self.shorts, 'L', 3)], area='Dokki')
+        Order.objects.filter(pk=cancelled.pk).update(status='cancelled')
+        make_order(status='cancelled')
+        products, areas = self.rollup()
+
+        DailyProductSales.objects.all().delete()
+        DailyAreaSales.objects.all().delete()
+        Order.objects.update(sales_counted=False)
+        out = io.StringIO()
+        call_command('rebuild_sales_rollup', stdout=out)
+
+        # The queryset update skipped the sync; the rebuild drops the Dokki order
+        self.assertEqual(products[('Shorts', 'L')], (4, 800))
+        self.assertIn('Wrote 4 rollup row(s)', out.getvalue())
+        self.assertEqual(self.rollup(), (
+            {('Tee', 'M'): (2, 600), ('Shorts', 'L'): (1, 200)},
+            {k: v for k, v in areas.items() if k[0] != 'Dokki'},
+        ))
+        self.assertFalse(Order.objects.get(pk=cancelled.pk).sales_counted)
+
+    def test_dashboard_reads_only_the_rollup(self):
+        self.place([(self.tee, 'M', 2), (self.shorts, 'L', 1)])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:store_dailyproductsales_changelist'), {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report']['revenue'], 800)
+        self.assertEqual(response.context['report']['units'], 3)
+        self.assertEqual([row['classification'] for row in response.context['report']['classifications']],
+                         ['tshirts', 'shorts'])
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('"store_order"', sql)
+        self.assertNotIn('"store_orderitem"', sql)
+
+
+class StockImportTests(TestCase):
+
+    def setUp(self):
+        self.tee = make_product('Tee', sizes={'M': 5, 'L': 2})
+        self.jeans = make_product('Jeans', classification='trouser', sizes={'32': 0})
+
+    def write_csv(self, text):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = f'{directory}/stock.csv'
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(text)
+        return path
+
+    def stock(self):
+        return {(ps.product.name, ps.size): ps.stock_count for ps in ProductSize.objects.select_related('product')}
+
+    def test_dry_run_shows_the_diff_and_writes_nothing(self):
+        before = self.stock()
+        out = io.StringIO()
+        path = self.write_csv(f'product_id,product,size,stock\n{self.tee.pk},,M,5\n{self.tee.pk},,L,9\n,Tee,XL,4\n')
+        call_command('import_stock', path, '--dry-run', stdout=out)
+
+        self.assertIn(f'Tee (#{self.tee.pk}) L: 2 -> 9', out.getvalue())
+        self.assertIn(f'Tee (#{self.tee.pk}) XL: new -> 4', out.getvalue())
+        self.assertIn('would create 1 size(s) and update 1, 1 unchanged', out.getvalue())
+        self.assertEqual(self.stock(), before)
+
+    def test_import_upserts_and_refreshes_stock_totals(self):
+        received = []
+        stock_changed.connect(lambda sender, product_ids, **kw: received.append(product_ids), weak=False,
+                              dispatch_uid='stock-import-test')
+        self.addCleanup(stock_changed.disconnect, dispatch_uid='stock-import-test')
+
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('import_stock', self.write_csv(
+                f'product_id,size,stock\n{self.tee.pk},L,0\n{self.tee.pk},XL,4\n{self.jeans.pk},32,7\n'
+                f'{self.jeans.pk},34,1\n{self.tee.pk},M,5\n'
+            ), stdout=io.StringIO())
+
+        self.assertEqual(self.stock(), {
+            ('Tee', 'M'): 5, ('Tee', 'L'): 0, ('Tee', 'XL'): 4, ('Jeans', '32'): 7, ('Jeans', '34'): 1,
+        })
+        self.assertEqual(received, [{self.tee.pk, self.jeans.pk}])
+        self.tee.refresh_from_db()
+        self.assertEqual((self.tee.total_stock, self.tee.available_sizes), (9, 'M, XL'))
+        # One INSERT for the new sizes, one UPDATE per new figure (0 and 7)
+        writes = [q['sql'] for q in ctx.captured_queries if 'store_productsize' in q['sql'].split(' WHERE')[0]]
+        self.assertEqual(sum(sql.startswith('INSERT') for sql in writes), 1)
+        self.assertEqual(sum(sql.startswith('UPDATE') for sql in writes), 2)
+
+    def test_invalid_lines_abort_the_whole_import(self):
+        make_product('Tee', sizes={})
+        path = self.write_csv(
+            f'product_id,product,size,stock\n{self.tee.pk},,M,50\n,Tee,L,1\n,Socks,M,1\n'
+            f'{self.tee.pk},,XXXL,1\n{self.jeans.pk},,32,-1\n{self.tee.pk},,M,6\n'
+        )
+        with self.assertRaises(CommandError) as raised:
+            call_command('import_stock', path, stdout=io.StringIO())
+
+        message = str(raised.exception)
+        self.assertIn("Line 3: several products named 'Tee'", message)
+        self.assertIn("Line 4: no product named 'Socks'", message)
+        self.assertIn("Line 5: unknown size 'XXXL'", message)
+        self.assertIn("Line 6: stock must be a whole number", message)
+        self.assertIn(f"Line 7: product {self.tee.pk} size M is listed twice", message)
+        self.assertEqual(ProductSize.objects.get(product=self.tee, size='M').stock_count, 5)
+
+    def test_admin_upload_previews_then_applies(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        url = reverse('admin:store_productsize_import')
+        self.assertContains(self.client.get(reverse('admin:store_productsize_changelist')), url)
+        upload = ContentFile(f'﻿product_id,size,stock\r\n{self.tee.pk},M,8\r\n'.encode(), name='stock.csv')
+
+        response = self.client.post(url, {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row[3:] for row in response.context['changes']], [(5, 8)])
+        self.assertEqual(ProductSize.objects.get(product=self.tee, size='M').stock_count, 5)
+
+        response = self.client.post(url, {'csv': response.context['csv'], 'apply': '1'})
+        self.assertRedirects(response, reverse('admin:store_productsize_changelist'))
+        self.assertEqual(ProductSize.objects.get(product=self.tee, size='M').stock_count, 8)
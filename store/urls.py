@@ -1,12 +1,19 @@
 from django.urls import path, include
-from .views import home, add_to_cart, remove_from_cart, checkout, place_order, order_success, products
+from .views import home, add_to_cart, remove_from_cart, checkout, place_order, order_success, products, product_section, cart_summary, metrics
+from .api import ProductViewSet, SearchView
 
 urlpatterns = [
     path('', home , name='home'),
     path('products/', products, name='products'),
     path('add/', add_to_cart, name='add_to_cart'),
     path('remove/', remove_from_cart, name='remove_from_cart'),
+    path('cart/', cart_summary, name='cart_summary'),
+    path('products/section/<slug:slug>/', product_section, name='product_section'),
     path('products/checkout/', checkout, name='checkout'),
     path('place-order/', place_order, name='place_order'),
     path('order-success/<int:order_number>/', order_success, name='order_success'),
+    path('api/products/', ProductViewSet.as_view({'get': 'list'}), name='api_products'),
+    path('api/products/<int:pk>/', ProductViewSet.as_view({'get': 'retrieve'}), name='api_product'),
+    path('api/search/', SearchView.as_view(), name='api_search'),
+    path('metrics', metrics, name='metrics'),
 ]
@@ -0,0 +1,53 @@
+import os
+import shutil
+import statistics
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+
+
+@contextmanager
+def scratch_database(alias="default"):
+    """
+    Point `alias` at a freshly migrated SQLite file for the duration of a
+    benchmark, so seeding and load never touch the real database.
+    Connections are closed on the way in so forked workers open their own.
+    """
+    connection = connections[alias]
+    if connection.vendor != "sqlite":
+        raise CommandError("Benchmarks run against a scratch SQLite database only.")
+
+    original = connection.settings_dict["NAME"]
+    workdir = tempfile.mkdtemp(prefix="hunters-bench-")
+    connections.close_all()
+    connection.settings_dict["NAME"] = os.path.join(workdir, "bench.sqlite3")
+    try:
+        call_command("migrate", database=alias, verbosity=0, interactive=False)
+        connections.close_all()
+        yield connection.settings_dict["NAME"]
+    finally:
+        connections.close_all()
+        connection.settings_dict["NAME"] = original
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """p50/p95/p99/mean of a list of durations in milliseconds."""
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 3) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+    }
@@ -1,13 +1,345 @@
+import functools
+import json
+import uuid
 from decimal import Decimal
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
 CART_KEY = "cart"
+CART_VERSION = 2
+
+# Session format (version 2):
+#
+#     {"v": 2, "lines": {"<product_id>:<size>": [qty, unit_price]}, "subtotal": 1234, "t": "<token>"}
+#
+# Lines are keyed by (product_id, size) so updates are a dict lookup, and
+# only the quantity and the price snapshot are stored; names, images and
+# size labels are filled in from the catalog when the cart is sent to the
+# browser (see Cart.to_client). Version 1 carts (a list of item dicts) are
+# migrated on first read. The optional token identifies the cart's stock
+# holds (see store.utils.holds).
+
+
+def get_cart(request):
+    """
+    The cart for this request, loaded from the configured storage once and
+    then reused, so repeated mutations in one request share one object.
+    """
+    if not getattr(request, "_cart_middleware", False):
+        raise ImproperlyConfigured("get_cart() needs store.utils.cart.CartMiddleware in MIDDLEWARE.")
+    if getattr(request, "_cart", None) is None:
+        data = get_cart_storage().load(request)
+        request._cart = Cart.from_session(data)
+        # Older carts are migrated on first read
+        request._cart_dirty = bool(data) and data.get("v") != CART_VERSION
+    return request._cart
+
+async def aget_cart(request):
+    """Async get_cart(), for views served under ASGI."""
+    if not getattr(request, "_cart_middleware", False):
+        raise ImproperlyConfigured("aget_cart() needs store.utils.cart.CartMiddleware in MIDDLEWARE.")
+    if getattr(request, "_cart", None) is None:
+        data = await _aload(get_cart_storage(), request)
+        request._cart = Cart.from_session(data)
+        request._cart_dirty = bool(data) and data.get("v") != CART_VERSION
+    return request._cart
+
+def save_cart(request, cart):
+    """Mark the cart changed; CartMiddleware writes it once per response."""
+    request._cart = cart
+    request._cart_dirty = True
+
+
+# ---------- Storage backends ----------
+# Selected with settings.CART_STORAGE ("session", "cache" or "cookie", or a
+# dotted path to a class with the same load/save interface). Backends may
+# also define aload/asave for async requests; otherwise load/save are run
+# in a thread.
+
+class SessionCartStorage:
+    """The cart lives in the Django session (the database by default)."""
+
+    def load(self, request):
+        return request.session.get(CART_KEY)
+
+    def save(self, request, response, data):
+        request.session[CART_KEY] = data
+        request.session.modified = True
+
+    async def aload(self, request):
+        return await request.session.aget(CART_KEY)
+
+    async def asave(self, request, response, data):
+        await request.session.aset(CART_KEY, data)
+
+
+class CacheCartStorage:
+    """
+    The cart lives in a cache (settings.CART_CACHE_ALIAS), keyed by a random
+    id kept in a cookie. Use a cache shared by all workers, such as the
+    file-based or memcached backends, when running more than one process.
+    """
+
+    cookie_name = "cart_id"
+
+    def cache(self):
+        return caches[getattr(settings, "CART_CACHE_ALIAS", "default")]
+
+    def load(self, request):
+        cart_id = request.COOKIES.get(self.cookie_name)
+        return self.cache().get(f"cart:{cart_id}") if cart_id else None
+
+    def save(self, request, response, data):
+        cart_id = request.COOKIES.get(self.cookie_name) or uuid.uuid4().hex
+        age = getattr(settings, "CART_COOKIE_AGE", 60 * 60 * 24 * 14)
+        self.cache().set(f"cart:{cart_id}", data, age)
+        response.set_cookie(self.cookie_name, cart_id, max_age=age, httponly=True, samesite="Lax")
+
+    async def aload(self, request):
+        cart_id = request.COOKIES.get(self.cookie_name)
+        return await self.cache().aget(f"cart:{cart_id}") if cart_id else None
+
+    async def asave(self, request, response, data):
+        cart_id = request.COOKIES.get(self.cookie_name) or uuid.uuid4().hex
+        age = getattr(settings, "CART_COOKIE_AGE", 60 * 60 * 24 * 14)
+        await self.cache().aset(f"cart:{cart_id}", data, age)
+        response.set_cookie(self.cookie_name, cart_id, max_age=age, httponly=True, samesite="Lax")
+
+
+class CookieCartStorage:
+    """
+    The cart lives in a signed cookie, so cart traffic never touches the
+    server. Browsers cap cookies at about 4 KB, which the compact format
+    keeps well clear of for normal carts.
+    """
+
+    cookie_name = "cart"
+    salt = "store.cart"
+
+    def load(self, request):
+        age = getattr(settings, "CART_COOKIE_AGE", 60 * 60 * 24 * 14)
+        raw = request.get_signed_cookie(self.cookie_name, default=None, salt=self.salt, max_age=age)
+        try:
+            return json.loads(raw) if raw else None
+        except ValueError:
+            return None
+
+    def save(self, request, response, data):
+        age = getattr(settings, "CART_COOKIE_AGE", 60 * 60 * 24 * 14)
+        response.set_signed_cookie(
+            self.cookie_name, json.dumps(data, separators=(",", ":")), salt=self.salt,
+            max_age=age, httponly=True, samesite="Lax",
+        )
+
+    # Cookies need no I/O, so the async versions are the sync ones
+    async def aload(self, request):
+        return self.load(request)
+
+    async def asave(self, request, response, data):
+        self.save(request, response, data)
+
+
+CART_STORAGE_BACKENDS = {
+    "session": SessionCartStorage,
+    "cache": CacheCartStorage,
+    "cookie": CookieCartStorage,
+}
+
+@functools.lru_cache(maxsize=None)
+def _load_storage(name):
+    backend = CART_STORAGE_BACKENDS.get(name) or import_string(name)
+    return backend()
+
+def get_cart_storage():
+    return _load_storage(getattr(settings, "CART_STORAGE", "session"))
+
+async def _aload(storage, request):
+    if hasattr(storage, "aload"):
+        return await storage.aload(request)
+    return await sync_to_async(storage.load)(request)
+
+async def _asave(storage, request, response, data):
+    if hasattr(storage, "asave"):
+        await storage.asave(request, response, data)
+    else:
+        await sync_to_async(storage.save)(request, response, data)
+
+
+class CartMiddleware:
+    """
+    Writes the request's cart back to storage at most once, after the view
+    has run, however many times the view called save_cart(). Must come after
+    SessionMiddleware. Works in both sync and async middleware chains.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request._cart_middleware = True
+        response = self.get_response(request)
+        if getattr(request, "_cart_dirty", False):
+            get_cart_storage().save(request, response, request._cart.to_session())
+            request._cart_dirty = False
+        return response
+
+    async def __acall__(self, request):
+        request._cart_middleware = True
+        response = await self.get_response(request)
+        if getattr(request, "_cart_dirty", False):
+            await _asave(get_cart_storage(), request, response, request._cart.to_session())
+            request._cart_dirty = False
+        return response
+
+
+def _price(value):
+    return int(Decimal(str(value)))
+
+
+class Cart:
+    """
+    Session cart with a running subtotal. Each line keeps the unit price
+    captured when it entered the cart, so adding or removing only adjusts
+    that line and the subtotal; checkout never re-prices the cart.
+    """
+
+    def __init__(self, lines=None, subtotal=None, token=None):
+        self.lines = lines or {}
+        if subtotal is None:
+            subtotal = sum(qty * price for qty, price in self.lines.values())
+        self.subtotal = subtotal
+        self.token = token
+
+    @staticmethod
+    def line_key(product_id, size=""):
+        return f"{product_id}:{size or ''}"
+
+    @staticmethod
+    def split_key(key):
+        product_id, _, size = key.partition(":")
+        return int(product_id), size
+
+    @classmethod
+    def from_session(cls, data):
+        if not data:
+            return cls()
+        if data.get("v") == CART_VERSION:
+            return cls(data["lines"], data.get("subtotal"), data.get("t"))
+        # Version 1: {"items": [{"product_id", "qty", "unit_price", "size", ...}]}
+        lines = {}
+        for item in data.get("items", []):
+            key = cls.line_key(item["product_id"], item.get("size", ""))
+            if key in lines:
+                lines[key][0] += item["qty"]
+            else:
+                lines[key] = [item["qty"], _price(item["unit_price"])]
+        return cls(lines)
+
+    def to_session(self):
+        data = {"v": CART_VERSION, "lines": self.lines, "subtotal": self.subtotal}
+        if self.token:
+            data["t"] = self.token
+        return data
+
+    def ensure_token(self):
+        if not self.token:
+            self.token = uuid.uuid4().hex
+        return self.token
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def quantity(self, product_id, size=""):
+        line = self.lines.get(self.line_key(product_id, size))
+        return line[0] if line else 0
+
+    def add(self, product_id, qty, unit_price, size=""):
+        """
+        Add `qty` units, creating the line with a price snapshot if needed.
+        `unit_price` is ignored (and may be None) when the line exists.
+        """
+        if qty < 1:
+            raise ValueError(f"Cannot add {qty} units")
+        key = self.line_key(product_id, size)
+        line = self.lines.get(key)
+        if line is None:
+            line = self.lines[key] = [0, _price(unit_price)]
+        line[0] += qty
+        self.subtotal += line[1] * qty
+
+    def remove(self, product_id, size="", qty=1):
+        """Take `qty` units off a line, dropping the line when it reaches zero."""
+        key = self.line_key(product_id, size)
+        line = self.lines.get(key)
+        if line is None:
+            return 0
+        qty = min(qty, line[0])
+        line[0] -= qty
+        self.subtotal -= line[1] * qty
+        if line[0] <= 0:
+            del self.lines[key]
+        return qty
+
+    def items(self):
+        """Cart lines as dicts with product_id, size, qty, unit_price and line_total."""
+        result = []
+        for key, (qty, price) in self.lines.items():
+            product_id, size = self.split_key(key)
+            result.append({
+                "product_id": product_id,
+                "size": size,
+                "qty": qty,
+                "unit_price": price,
+                "line_total": qty * price,
+            })
+        return result
+
+    def to_client(self):
+        """
+        The cart as the storefront JS expects it, with display details
+        filled in from one catalog query.
+        """
+        from store.models import Products
+
+        items = self.items()
+        products = {}
+        if items:
+            products = Products.objects.only("name", "image").in_bulk({item["product_id"] for item in items})
+        return self._client_data(items, products)
 
-def get_cart(session):
-    cart = session.get(CART_KEY, {"items": []})
-    return cart
+    async def ato_client(self):
+        from store.models import Products
 
-def save_cart(session, cart):
-    session[CART_KEY] = cart
-    session.modified = True
+        items = self.items()
+        products = {}
+        if items:
+            products = await Products.objects.only("name", "image").ain_bulk({item["product_id"] for item in items})
+        return self._client_data(items, products)
 
+    def _client_data(self, items, products):
+        from store.models import ProductSize
 
+        size_labels = dict(ProductSize.SIZE_CHOICES)
+        for item in items:
+            product = products.get(item["product_id"])
+            item["name"] = product.name if product else ""
+            item["image_url"] = product.image.url if product and product.image else ""
+            if item["size"]:
+                item["size_display"] = size_labels.get(item["size"], item["size"])
+            else:
+                del item["size"]
+        return {"items": items, "subtotal": self.subtotal}
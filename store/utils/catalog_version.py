@@ -0,0 +1,118 @@
+import hashlib
+import json
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+VERSION_PK = 1
+
+
+def get_catalog_version(request=None):
+    """
+    (version, updated_at) of the catalog with one primary-key read, memoised
+    on `request` so the ETag and Last-Modified checks share it.
+    """
+    from store.models import CatalogVersion
+
+    cached = getattr(request, "_catalog_version", None)
+    if cached is not None:
+        return cached
+    row = CatalogVersion.objects.filter(pk=VERSION_PK).values_list("version", "updated_at").first()
+    if row is None:
+        catalog, _ = CatalogVersion.objects.get_or_create(pk=VERSION_PK)
+        row = (catalog.version, catalog.updated_at)
+    if request is not None:
+        request._catalog_version = row
+    return row
+
+
+def bump_catalog_version():
+    from store.models import CatalogVersion
+
+    now = timezone.now()
+    if not CatalogVersion.objects.filter(pk=VERSION_PK).update(version=F("version") + 1, updated_at=now):
+        CatalogVersion.objects.get_or_create(pk=VERSION_PK, defaults={"version": 1, "updated_at": now})
+
+
+def schedule_catalog_bump():
+    """
+    Bump the version once the current transaction commits, so a client can
+    never cache a page under the new version that still shows the old data.
+    Code that writes the catalog with queryset.update() or bulk operations
+    must call this (or send stock_changed) itself.
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+def row_digest(*values):
+    """
+    Stable 64-bit digest of one row. XORed over a table it gives a content
+    fingerprint that is the same in every process holding the same rows and
+    can be updated a row at a time.
+    """
+    return int.from_bytes(hashlib.blake2b(repr(values).encode(), digest_size=8).digest(), "big")
+
+
+# The version only says what the database holds. Pages that show stock read
+# it from the in-process stock index, which can lag other workers' writes by
+# STOCK_INDEX_TTL, so their ETags also carry the index's fingerprint: a page
+# rendered from a stale index is re-sent once the index catches up.
+
+def _stock_fingerprint():
+    from store.utils.stock_index import stock_index
+
+    return stock_index.fingerprint()
+
+
+def catalog_etag(request, *args, **kwargs):
+    """ETag for catalog fragments that depend on the catalog, its stock and the URL."""
+    version, _ = get_catalog_version(request)
+    key = f"{version}|{_stock_fingerprint()}|{request.get_full_path()}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+# ---------- Storefront conditional GET ----------
+# Storefront pages embed the visitor's cart and a CSRF token, so the ETag
+# mixes the catalog version with a fingerprint of both. Requests without a
+# CSRF cookie are always rendered, since the response is what sets it.
+
+def _cart_fingerprint(request):
+    from store.utils.cart import get_cart
+
+    cart = get_cart(request)
+    if not cart:
+        return ""
+    return json.dumps(cart.to_session(), sort_keys=True, separators=(",", ":"))
+
+
+def storefront_etag(request, *args, stock=False, **kwargs):
+    from django.conf import settings
+
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    if not csrf_cookie:
+        return None
+    version, _ = get_catalog_version(request)
+    if stock:
+        version = f"{version}|{_stock_fingerprint()}"
+    key = f"{version}|{request.path}|{csrf_cookie}|{_cart_fingerprint(request)}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def stock_storefront_etag(request, *args, **kwargs):
+    return storefront_etag(request, *args, stock=True, **kwargs)
+
+
+def storefront_last_modified(request, *args, **kwargs):
+    # Only an empty cart leaves the page identical for a given catalog
+    # version; carts are told apart by the ETag alone.
+    if storefront_etag(request) is None or _cart_fingerprint(request):
+        return None
+    return get_catalog_version(request)[1]
+
+
+storefront_condition = condition(etag_func=storefront_etag, last_modified_func=storefront_last_modified)
+# For pages that show stock. Index refreshes have no timestamp a client's
+# If-Modified-Since could be compared with, so these send only the ETag.
+stock_storefront_condition = condition(etag_func=stock_storefront_etag)
@@ -0,0 +1,41 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connections, transaction
+
+# Error text / SQLSTATE codes for failures that succeed when simply retried:
+# SQLite's busy and locked errors, and deadlocks or serialization failures
+# on server databases.
+TRANSIENT_MESSAGES = ("database is locked", "database table is locked", "deadlock")
+TRANSIENT_SQLSTATES = {"40001", "40P01"}
+
+
+def is_transient(exc):
+    cause = exc.__cause__
+    sqlstate = getattr(cause, "sqlstate", None) or getattr(cause, "pgcode", None)
+    if sqlstate in TRANSIENT_SQLSTATES:
+        return True
+    return isinstance(exc, OperationalError) and any(text in str(exc).lower() for text in TRANSIENT_MESSAGES)
+
+
+def atomic_with_retry(func, using="default", attempts=None, delay=None):
+    """
+    Run `func()` in its own transaction, retrying with exponential back-off
+    and jitter when the database reports a transient lock error. Anything
+    else, or the last failure, is raised. Inside an outer atomic block it
+    runs once, since a retry could not undo what the outer block did.
+    """
+    attempts = attempts or getattr(settings, "DB_RETRY_ATTEMPTS", 4)
+    delay = delay if delay is not None else getattr(settings, "DB_RETRY_DELAY", 0.05)
+    if connections[using].in_atomic_block:
+        attempts = 1
+
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic(using=using):
+                return func()
+        except DatabaseError as exc:
+            if attempt == attempts - 1 or not is_transient(exc):
+                raise
+            time.sleep(delay * (2 ** attempt) * random.uniform(0.5, 1.5))
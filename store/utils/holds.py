@@ -0,0 +1,156 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from store.models import ProductSize, StockHold
+from store.signals import holds_changed
+
+# Holds reserve units as soon as they enter a cart by counting them in
+# ProductSize.held; stock_count stays the number of units on the shelf, so
+# setting it (admin, stock import) can never count held units twice.
+# A hold is given back when the line is removed or when the hold expires.
+
+_last_sweep = {"at": 0.0}
+
+
+def holds_enabled():
+    return hold_ttl() > 0
+
+
+def hold_ttl():
+    return int(getattr(settings, "CART_HOLD_TTL", 15 * 60))
+
+
+def place_hold(cart_token, product_id, size, qty):
+    """
+    Reserve `qty` units of (product_id, size) for this cart and push back
+    the expiry of every hold the cart owns. Returns False, without holding
+    anything, if there are not enough free units.
+    """
+    if qty < 1:
+        raise ValueError(f"Cannot hold {qty} units")
+    expires_at = timezone.now() + timedelta(seconds=hold_ttl())
+    with transaction.atomic():
+        taken = ProductSize.objects.filter(
+            product_id=product_id, size=size, stock_count__gte=F("held") + qty,
+        ).update(held=F("held") + qty)
+        if not taken:
+            return False
+
+        StockHold.objects.filter(cart_token=cart_token).update(expires_at=expires_at)
+        extended = StockHold.objects.filter(
+            cart_token=cart_token, product_id=product_id, size=size,
+        ).update(quantity=F("quantity") + qty)
+        if not extended:
+            try:
+                with transaction.atomic():
+                    StockHold.objects.create(
+                        cart_token=cart_token, product_id=product_id, size=size,
+                        quantity=qty, expires_at=expires_at,
+                    )
+            except IntegrityError:
+                StockHold.objects.filter(
+                    cart_token=cart_token, product_id=product_id, size=size,
+                ).update(quantity=F("quantity") + qty)
+        holds_changed.send(sender=StockHold, product_ids={product_id})
+    return True
+
+
+def release_hold(cart_token, product_id, size, qty=1):
+    """Give back up to `qty` held units of (product_id, size)."""
+    if qty < 1:
+        raise ValueError(f"Cannot release {qty} units")
+    with transaction.atomic():
+        hold = (
+            StockHold.objects.select_for_update()
+            .filter(cart_token=cart_token, product_id=product_id, size=size)
+            .first()
+        )
+        if hold is None:
+            return 0
+        qty = min(qty, hold.quantity)
+        if qty == hold.quantity:
+            hold.delete()
+        else:
+            StockHold.objects.filter(pk=hold.pk).update(quantity=F("quantity") - qty)
+        _unhold({(product_id, size): qty})
+    return qty
+
+
+def _unhold(quantities):
+    """Stop holding units of several ProductSize rows with one UPDATE."""
+    quantities = {key: qty for key, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+    rows = Q()
+    cases = []
+    for (product_id, size), qty in quantities.items():
+        match = Q(product_id=product_id, size=size)
+        rows |= match
+        cases.append(When(match, then=Value(qty)))
+    # Floored at 0: a size deleted and re-added meanwhile starts with nothing held
+    ProductSize.objects.filter(rows).update(
+        held=Greatest(F("held") - Case(*cases, default=Value(0)), Value(0)),
+    )
+    holds_changed.send(sender=StockHold, product_ids={product_id for product_id, _ in quantities})
+
+
+def release_expired_holds(now=None):
+    """
+    Give every expired hold back to stock. Costs one indexed SELECT when
+    nothing has expired. Returns the number of holds released.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(
+            StockHold.objects.select_for_update()
+            .filter(expires_at__lte=now)
+            .values_list("pk", "product_id", "size", "quantity")
+        )
+        if not expired:
+            return 0
+        quantities = defaultdict(int)
+        for _, product_id, size, qty in expired:
+            quantities[(product_id, size)] += qty
+        StockHold.objects.filter(pk__in=[row[0] for row in expired]).delete()
+        _unhold(quantities)
+    return len(expired)
+
+
+def maybe_release_expired_holds():
+    """Sweep at most once every CART_HOLD_SWEEP_INTERVAL seconds per process."""
+    interval = getattr(settings, "CART_HOLD_SWEEP_INTERVAL", 60)
+    if time.monotonic() - _last_sweep["at"] < interval:
+        return 0
+    _last_sweep["at"] = time.monotonic()
+    return release_expired_holds()
+
+
+async def amaybe_release_expired_holds():
+    """maybe_release_expired_holds() for async views."""
+    interval = getattr(settings, "CART_HOLD_SWEEP_INTERVAL", 60)
+    if time.monotonic() - _last_sweep["at"] < interval:
+        return 0
+    return await sync_to_async(maybe_release_expired_holds)()
+
+
+def convert_holds(cart_token):
+    """
+    Give up the cart's holds at checkout, so the units they reserved are
+    free for the order that is taking them from stock in the same
+    transaction. Must run inside the checkout transaction.
+    """
+    held = defaultdict(int)
+    holds = list(StockHold.objects.select_for_update().filter(cart_token=cart_token))
+    for hold in holds:
+        held[(hold.product_id, hold.size)] += hold.quantity
+    if holds:
+        StockHold.objects.filter(pk__in=[hold.pk for hold in holds]).delete()
+    _unhold(held)
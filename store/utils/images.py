@@ -0,0 +1,105 @@
+import hashlib
+import io
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+
+# Product cards are 340px wide (315px on phones); the widths cover 1x and
+# 2x screens. Variants are never upscaled past the original.
+DEFAULT_WIDTHS = (320, 480, 680)
+VARIANT_DIR = "products/variants"
+
+
+def variant_widths():
+    return tuple(getattr(settings, "PRODUCT_IMAGE_WIDTHS", DEFAULT_WIDTHS))
+
+
+def build_variants(name, storage=default_storage):
+    """
+    Write WebP and JPEG copies of the stored image `name` at each width and
+    return the metadata kept in Products.image_variants. File names carry a
+    hash of the source bytes, so unchanged images are never re-encoded and
+    variant URLs can be cached forever.
+    """
+    from PIL import Image
+
+    with storage.open(name, "rb") as fh:
+        data = fh.read()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+
+    with Image.open(io.BytesIO(data)) as original:
+        original.load()
+        source_width, source_height = original.size
+        if original.mode in ("RGBA", "LA", "P"):
+            rgba = original.convert("RGBA")
+            flat = Image.new("RGB", rgba.size, (255, 255, 255))
+            flat.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            rgba, flat = original.convert("RGB"), original.convert("RGB")
+
+        widths = sorted({min(width, source_width) for width in variant_widths()})
+        variants = {"webp": {}, "jpeg": {}}
+        for width in widths:
+            height = round(source_height * width / source_width)
+            for fmt, image, options in (
+                ("webp", rgba, {"quality": 80, "method": 6}),
+                ("jpeg", flat, {"quality": 82, "optimize": True, "progressive": True}),
+            ):
+                ext = "jpg" if fmt == "jpeg" else fmt
+                target = f"{VARIANT_DIR}/{stem}-{width}w.{digest}.{ext}"
+                if not storage.exists(target):
+                    buffer = io.BytesIO()
+                    resized = image if width == source_width else image.resize((width, height), Image.LANCZOS)
+                    resized.save(buffer, fmt.upper(), **options)
+                    storage.save(target, ContentFile(buffer.getvalue()))
+                variants[fmt][str(width)] = target
+
+    return {"source": name, "width": source_width, "height": source_height, **variants}
+
+
+def _build_one(name):
+    try:
+        return name, build_variants(name), None
+    except Exception as exc:
+        return name, None, str(exc)
+
+
+def refresh_image_variants(products, workers=1, force=False):
+    """
+    Build variants for every product whose image has none yet (or all of
+    them with `force`), spreading the encoding over `workers` processes.
+    Returns (updated, errors) where errors maps image name to message.
+    """
+    from store.models import Products
+
+    pending = {}
+    for product in products:
+        if product.image and (force or product.image_variants.get("source") != product.image.name):
+            pending.setdefault(product.image.name, []).append(product)
+    if not pending:
+        return 0, {}
+
+    if workers > 1:
+        # Encoding only touches storage; close connections so forked workers
+        # never share the parent's database handle.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_build_one, pending))
+    else:
+        results = [_build_one(name) for name in pending]
+
+    updated, errors = [], {}
+    for name, variants, error in results:
+        if error:
+            errors[name] = error
+            continue
+        for product in pending[name]:
+            product.image_variants = variants
+            updated.append(product)
+    Products.objects.bulk_update(updated, ["image_variants"], batch_size=500)
+    return len(updated), errors
@@ -0,0 +1,68 @@
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, F, Max
+from django.db.models.functions import Cast
+
+ORDER_SEQUENCE = "order"
+
+# Numbers reserved by this process but not handed out yet.
+_block = {"next": 0, "end": -1}
+_lock = threading.Lock()
+
+
+def _block_size():
+    return max(1, int(getattr(settings, "ORDER_NUMBER_BLOCK_SIZE", 1)))
+
+
+def _seed_value():
+    from store.models import Order
+
+    numeric = Order.objects.filter(order_number__regex=r"^[0-9]+$")
+    last = numeric.aggregate(m=Max(Cast("order_number", output_field=BigIntegerField())))["m"]
+    return last or 0
+
+
+def reserve_block(size, name=ORDER_SEQUENCE):
+    """
+    Bump the counter row by `size` and return the (first, last) numbers
+    reserved. Runs in its own short transaction so the counter row is
+    only locked for a single UPDATE.
+    """
+    from store.models import OrderNumberCounter
+
+    with transaction.atomic():
+        updated = OrderNumberCounter.objects.filter(name=name).update(value=F("value") + size)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    OrderNumberCounter.objects.create(name=name, value=_seed_value() + size)
+            except IntegrityError:
+                # Another worker created the row first.
+                OrderNumberCounter.objects.filter(name=name).update(value=F("value") + size)
+        end = OrderNumberCounter.objects.values_list("value", flat=True).get(name=name)
+    return end - size + 1, end
+
+
+def allocate_order_number():
+    """
+    Return the next order number as a string.
+
+    With ORDER_NUMBER_BLOCK_SIZE = 1 (the default) every call costs one
+    UPDATE and numbers are strictly sequential across all workers. Larger
+    blocks let each worker hand out numbers from memory; numbers stay
+    unique and increasing per worker, and a restart may leave gaps.
+    """
+    with _lock:
+        if _block["next"] > _block["end"]:
+            _block["next"], _block["end"] = reserve_block(_block_size())
+        number = _block["next"]
+        _block["next"] += 1
+    return str(number)
+
+
+def reset_block():
+    """Drop any numbers this process reserved but did not use."""
+    with _lock:
+        _block["next"], _block["end"] = 0, -1
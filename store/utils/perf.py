@@ -0,0 +1,332 @@
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+PHASES = ("db", "template", "session_read", "session_write")
+
+# Timings of the request being handled, or None when it is not sampled.
+# A context variable rather than a thread-local, so it follows async views
+# into the threads sync_to_async runs their database calls in.
+_current = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self._active = set()
+
+    def add(self, phase, seconds):
+        self.seconds[phase] += seconds
+
+    @contextmanager
+    def measure(self, phase):
+        # Nested calls (aload() running load(), say) are counted once
+        if phase in self._active:
+            yield
+            return
+        self._active.add(phase)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._active.discard(phase)
+            self.add(phase, time.perf_counter() - started)
+
+
+def _timed(phase, func):
+    def wrapper(*args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return func(*args, **kwargs)
+        with timings.measure(phase):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _atimed(phase, func):
+    async def wrapper(*args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return await func(*args, **kwargs)
+        with timings.measure(phase):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+# ---------- Collectors ----------
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add("db", time.perf_counter() - started)
+        timings.queries += 1
+
+
+def install_query_timer(sender=None, connection=None, **kwargs):
+    # Wrappers live on the connection wrapper, so each (thread-local)
+    # connection needs it once, however often it reconnects
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(install_query_timer)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        return _timed("template", super().render)(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose top-level renders count as template time."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class TimedSessionMiddleware(SessionMiddleware):
+    """SessionMiddleware that counts loading and saving the session."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        if _current.get() is not None:
+            session = request.session
+            session.load = _timed("session_read", session.load)
+            session.save = _timed("session_write", session.save)
+            session.aload = _atimed("session_read", session.aload)
+            session.asave = _atimed("session_write", session.asave)
+
+
+# ---------- Aggregation ----------
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+
+    def observe(self, label_values, value):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+            yield f'{self.name}_bucket{{{labels},le="+Inf"}} {count}'
+            yield f"{self.name}_sum{{{labels}}} {total:.6f}"
+            yield f"{self.name}_count{{{labels}}} {count}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._series = {}
+
+    def inc(self, label_values):
+        self._series[label_values] = self._series.get(label_values, 0) + 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in sorted(self._series.items()):
+            yield f"{self.name}{{{_labels(self.labels, label_values)}}} {value}"
+
+
+def _labels(names, values):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class Metrics:
+    """
+    Per-route request metrics of this process, in Prometheus text format.
+    Every request counts towards the request counter and duration
+    histogram; the database, template and session breakdown comes from
+    the sampled requests only (PERF_SAMPLE_RATE). With several worker
+    processes each serves its own numbers, so scrape every worker or
+    aggregate with the process label of your scraper.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = Counter(
+                "hunters_http_requests_total", "Requests handled.", ("route", "method", "status"),
+            )
+            self.duration = Histogram(
+                "hunters_http_request_duration_seconds", "Wall time of the request.", SECONDS_BUCKETS, ("route",),
+            )
+            self.phases = Histogram(
+                "hunters_http_request_phase_seconds",
+                "Time spent per request in SQL queries, template rendering and session reads/writes (sampled).",
+                SECONDS_BUCKETS, ("route", "phase"),
+            )
+            self.queries = Histogram(
+                "hunters_http_request_queries", "SQL queries per request (sampled).", QUERY_BUCKETS, ("route",),
+            )
+
+    def record(self, route, method, status, seconds, timings):
+        with self._lock:
+            self.requests.inc((route, method, str(status)))
+            self.duration.observe((route,), seconds)
+            if timings is not None:
+                self.queries.observe((route,), timings.queries)
+                for phase, value in timings.seconds.items():
+                    self.phases.observe((route, phase), value)
+
+    def render(self):
+        with self._lock:
+            lines = [
+                line
+                for metric in (self.requests, self.duration, self.phases, self.queries)
+                for line in metric.render()
+            ]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# ---------- Middleware ----------
+
+def _route(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "unmatched"
+
+
+def _server_timing(seconds, timings):
+    entries = [f"total;dur={seconds * 1000:.1f}"]
+    if timings is not None:
+        entries.append(f'db;dur={timings.seconds["db"] * 1000:.1f};desc="{timings.queries} queries"')
+        entries.append(f'tpl;dur={timings.seconds["template"] * 1000:.1f}')
+        session = timings.seconds["session_read"] + timings.seconds["session_write"]
+        entries.append(f"session;dur={session * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class PerformanceMiddleware:
+    """
+    Times every request and records it in `metrics` by route (URL name).
+    A PERF_SAMPLE_RATE share of requests also get a breakdown of SQL,
+    template and session time; requests slower than PERF_SLOW_REQUEST_MS
+    or running more than PERF_SLOW_REQUEST_QUERIES queries are logged.
+    With PERF_SERVER_TIMING the numbers are sent as a Server-Timing header,
+    to staff users and METRICS_ALLOWED_IPS only: they would tell anyone
+    else how the site's queries and templates perform.
+    Goes first in MIDDLEWARE, so the whole chain is measured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection=connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, "PERF_METRICS_ENABLED", True):
+            return self.get_response(request)
+        timings, token = self._start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - started
+        return self._finish(request, response, seconds, timings, self._show_timing(request))
+
+    async def __acall__(self, request):
+        if not getattr(settings, "PERF_METRICS_ENABLED", True):
+            return await self.get_response(request)
+        timings, token = self._start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - started
+        return self._finish(request, response, seconds, timings, await self._ashow_timing(request))
+
+    def _start(self):
+        rate = getattr(settings, "PERF_SAMPLE_RATE", 1.0)
+        timings = RequestTimings() if rate >= 1 or random.random() < rate else None
+        return timings, _current.set(timings)
+
+    def _show_timing(self, request, user=None):
+        if not getattr(settings, "PERF_SERVER_TIMING", False):
+            return False
+        if request.META.get("REMOTE_ADDR") in getattr(settings, "METRICS_ALLOWED_IPS", ()):
+            return True
+        if user is None:
+            user = getattr(request, "user", None)
+        return bool(user is not None and user.is_staff)
+
+    async def _ashow_timing(self, request):
+        if not getattr(settings, "PERF_SERVER_TIMING", False) or not hasattr(request, "auser"):
+            return self._show_timing(request)
+        return self._show_timing(request, await request.auser())
+
+    def _finish(self, request, response, seconds, timings, show_timing):
+        route = _route(request)
+        metrics.record(route, request.method, response.status_code, seconds, timings)
+
+        slow_ms = getattr(settings, "PERF_SLOW_REQUEST_MS", 500)
+        slow_queries = getattr(settings, "PERF_SLOW_REQUEST_QUERIES", 50)
+        if (slow_ms and seconds * 1000 >= slow_ms) or (timings and slow_queries and timings.queries >= slow_queries):
+            logger.warning(
+                "Slow request %s %s (%s): %s", request.method, request.path, route, _server_timing(seconds, timings),
+            )
+
+        if show_timing:
+            response["Server-Timing"] = _server_timing(seconds, timings)
+        return response
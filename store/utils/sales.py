@@ -0,0 +1,194 @@
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Max, Min, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def _rollups():
+    """
+    (model, key fields, grouping) of each rollup table. Grouping maps the
+    rollup's fields to OrderItem expressions; fields outside the key are
+    only written when a row is created.
+    """
+    from store.models import DailyAreaSales, DailyProductSales
+
+    day = TruncDate("order__created_at")
+    # As recorded on the line, so taking an order out after the product was
+    # reclassified hits the same rows that adding it did
+    classification = F("classification")
+    return [
+        (DailyProductSales, ("day", "product_id", "size"),
+         {"day": day, "product_id": F("product_id"), "size": Coalesce("size", Value("")),
+          "classification": classification}),
+        (DailyAreaSales, ("day", "area", "classification"),
+         {"day": day, "area": F("order__area"), "classification": classification}),
+    ]
+
+
+def _day_bounds(start, end):
+    """Aware datetimes covering the local days `start`..`end` inclusive."""
+    tz = timezone.get_current_timezone()
+    since = datetime.datetime.combine(start, datetime.time.min, tzinfo=tz)
+    until = datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+    return since, until
+
+
+def _contributions(items, grouping):
+    """Units and revenue of the OrderItem queryset `items`, grouped by `grouping`."""
+    # Aliased so the grouped names never collide with OrderItem's own fields
+    aliases = {f"g_{name}": expression for name, expression in grouping.items()}
+    rows = (
+        items.order_by()
+        .values(**aliases)
+        .annotate(units=Sum("quantity"), revenue=Sum(F("quantity") * F("price")))
+    )
+    for row in rows:
+        out = {name: row[f"g_{name}"] for name in grouping}
+        out.update(units=row["units"], revenue=row["revenue"])
+        yield out
+
+
+def _apply(items, sign):
+    """Add (sign=1) or take out (sign=-1) the OrderItems `items` from every rollup."""
+    for model, key_fields, grouping in _rollups():
+        for row in _contributions(items, grouping):
+            key = {name: row[name] for name in key_fields}
+            delta = {"units": F("units") + sign * row["units"], "revenue": F("revenue") + sign * row["revenue"]}
+            if model.objects.filter(**key).update(**delta) or sign < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    model.objects.create(**row)
+            except IntegrityError:
+                # Created by a concurrent order since the update above
+                model.objects.filter(**key).update(**delta)
+
+
+def sync_order_sales(order_ids):
+    """
+    Bring the sales rollups in line with the current status of these orders: add
+    the lines of live orders not counted yet and take out cancelled ones
+    that are. Orders already in the right state are left alone, so calling
+    this again (or for orders that did not change) is harmless.
+    """
+    from store.models import Order, OrderItem
+
+    order_ids = list(order_ids)
+    for start in range(0, len(order_ids), BATCH_SIZE):
+        with transaction.atomic():
+            rows = (
+                Order.objects.select_for_update()
+                .filter(pk__in=order_ids[start:start + BATCH_SIZE])
+                .values_list("pk", "status", "sales_counted")
+            )
+            add, remove = [], []
+            for pk, status, counted in rows:
+                if status != "cancelled" and not counted:
+                    add.append(pk)
+                elif status == "cancelled" and counted:
+                    remove.append(pk)
+            if add:
+                _apply(OrderItem.objects.filter(order_id__in=add), 1)
+                Order.objects.filter(pk__in=add).update(sales_counted=True)
+            if remove:
+                _apply(OrderItem.objects.filter(order_id__in=remove), -1)
+                Order.objects.filter(pk__in=remove).update(sales_counted=False)
+
+
+def schedule_sales_sync(order_ids):
+    """Run sync_order_sales once the current transaction commits."""
+    order_ids = list(order_ids)
+    transaction.on_commit(lambda: sync_order_sales(order_ids))
+
+
+def remove_order_sales(order_id):
+    """Take a counted order out of the sales rollups now, before its lines are deleted."""
+    from store.models import Order, OrderItem
+
+    if Order.objects.filter(pk=order_id, sales_counted=True).exists():
+        _apply(OrderItem.objects.filter(order_id=order_id), -1)
+
+
+def rebuild_sales_rollup(start=None, end=None, batch_days=31):
+    """
+    Recompute the sales rollups from the orders for the local days
+    `start`..`end` (default: all of them), `batch_days` at a time, each
+    batch in its own transaction. Repairs any drift and backfills history.
+    Returns the number of rollup rows written.
+    """
+    from store.models import Order, OrderItem
+
+    rollups = _rollups()
+    if start is None or end is None:
+        span = Order.objects.aggregate(first=Min("created_at"), last=Max("created_at"))
+        if span["first"] is None:
+            for model, _, _ in rollups:
+                model.objects.all().delete()
+            return 0
+        start = start or timezone.localdate(span["first"])
+        end = end or timezone.localdate(span["last"])
+
+    written = 0
+    day = start
+    while day <= end:
+        batch_end = min(end, day + datetime.timedelta(days=batch_days - 1))
+        since, until = _day_bounds(day, batch_end)
+        with transaction.atomic():
+            Order.objects.filter(created_at__gte=since, created_at__lt=until).update(
+                sales_counted=Case(When(status="cancelled", then=False), default=True)
+            )
+            items = OrderItem.objects.filter(
+                order__created_at__gte=since, order__created_at__lt=until,
+            ).exclude(order__status="cancelled")
+            for model, _, grouping in rollups:
+                model.objects.filter(day__gte=day, day__lte=batch_end).delete()
+                rows = [model(**row) for row in _contributions(items, grouping)]
+                model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+                written += len(rows)
+        day = batch_end + datetime.timedelta(days=1)
+    return written
+
+
+def schedule_sales_rebuild(day):
+    """Recompute one day's rollup after commit, e.g. when an order's lines were edited."""
+    transaction.on_commit(lambda: rebuild_sales_rollup(day, day))
+
+
+def sales_report(start, end, top=10):
+    """
+    Units and revenue for the local days `start`..`end`, read from the
+    rollups only: totals, a per-day series and breakdowns by
+    classification, area, size and product (the `top` best sellers).
+    """
+    from store.models import DailyAreaSales, DailyProductSales
+
+    totals = {"units": Sum("units"), "revenue": Sum("revenue")}
+    by_area = DailyAreaSales.objects.filter(day__gte=start, day__lte=end).order_by()
+    by_product = DailyProductSales.objects.filter(day__gte=start, day__lte=end).order_by()
+
+    def breakdown(rows, *fields, limit=None):
+        grouped = rows.values(*fields).annotate(**totals).order_by("-revenue", *fields)
+        return list(grouped[:limit] if limit else grouped)
+
+    per_day = {row["day"]: row for row in by_area.values("day").annotate(**totals)}
+    days = []
+    day = start
+    while day <= end:
+        days.append(per_day.get(day, {"day": day, "units": 0, "revenue": 0}))
+        day += datetime.timedelta(days=1)
+
+    return {
+        "start": start,
+        "end": end,
+        "units": sum(row["units"] for row in days),
+        "revenue": sum(row["revenue"] for row in days),
+        "days": days,
+        "classifications": breakdown(by_area, "classification"),
+        "areas": breakdown(by_area, "area"),
+        "sizes": breakdown(by_product, "size"),
+        "products": breakdown(by_product, "product_id", "product__name", limit=top),
+    }
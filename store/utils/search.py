@@ -0,0 +1,234 @@
+import bisect
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from store.utils.catalog_version import row_digest
+
+TOKEN = re.compile(r"\w+")
+SORTS = ("relevance", "price", "-price", "name", "newest")
+FIELDS = (
+    "id", "name", "price", "compare_price", "classification", "best_seller",
+    "image", "total_stock", "available_sizes",
+)
+
+
+def tokenize(text):
+    return TOKEN.findall((text or "").lower())
+
+
+class _Snapshot:
+    """One complete build of the index; never changed once published."""
+
+    def __init__(self, docs):
+        self.docs = {}
+        self.postings = defaultdict(set)
+        self.by_classification = defaultdict(set)
+        self.by_size = defaultdict(set)
+        self.in_stock = set()
+        self.fingerprint = 0
+        for doc in docs:
+            self._add(doc)
+        self.prices = sorted((doc["price"], pk) for pk, doc in self.docs.items())
+        self.vocabulary = sorted(self.postings)
+
+    def _add(self, doc):
+        pk = doc["id"]
+        self.docs[pk] = doc
+        self.fingerprint ^= row_digest(*(doc[field] for field in FIELDS))
+        for token in doc["tokens"]:
+            self.postings[token].add(pk)
+        for size in doc["sizes"]:
+            self.by_size[size].add(pk)
+        for classification in _classifications(doc):
+            self.by_classification[classification].add(pk)
+        if doc["total_stock"] > 0:
+            self.in_stock.add(pk)
+
+
+def _classifications(doc):
+    # Flagged best sellers are also listed under the best-sellers tab
+    if doc["best_seller"] and doc["classification"] != "best-sellers":
+        return [doc["classification"], "best-sellers"]
+    return [doc["classification"]]
+
+
+class SearchIndex:
+    """
+    In-process inverted index over the catalog for search and filtering.
+
+    Built from the Products table with one query (stock comes from the
+    maintained total_stock/available_sizes columns). Products changed in
+    this process are re-read on the next search, the same way as
+    store.utils.stock_index; changes made elsewhere are picked up when the
+    index expires after SEARCH_INDEX_TTL seconds. Every rebuild makes a new
+    snapshot and publishes it with one assignment, so searches run without
+    the lock and never see a partly built index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stale = set()
+        self._loaded_at = 0.0
+
+    def _fetch(self, product_ids=None):
+        from store.models import Products
+
+        rows = Products.objects.order_by("id").values(*FIELDS)
+        if product_ids is not None:
+            rows = rows.filter(pk__in=product_ids)
+        return {row["id"]: self._doc(row) for row in rows}
+
+    @staticmethod
+    def _doc(row):
+        row["tokens"] = set(tokenize(row["name"]))
+        row["sizes"] = [size.strip() for size in row["available_sizes"].split(",") if size.strip()]
+        row["price"] = row["price"] or 0
+        return row
+
+    def _ensure_fresh(self):
+        ttl = getattr(settings, "SEARCH_INDEX_TTL", 30)
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._loaded_at > ttl:
+                self._stale.clear()
+                self._snapshot = _Snapshot(self._fetch().values())
+                self._loaded_at = time.monotonic()
+            elif self._stale:
+                # Re-indexing the documents already in memory is cheap next
+                # to patching shared sets that searches are reading
+                docs = dict(self._snapshot.docs)
+                fresh = self._fetch(self._stale)
+                for pk in self._stale:
+                    docs.pop(pk, None)
+                docs.update(fresh)
+                self._stale.clear()
+                self._snapshot = _Snapshot(docs[pk] for pk in sorted(docs))
+            return self._snapshot
+
+    def fingerprint(self):
+        """Hex digest of the indexed rows, equal in every process that indexed the same rows."""
+        return f"{self._ensure_fresh().fingerprint:016x}"
+
+    def invalidate(self, product_ids=None):
+        with self._lock:
+            if product_ids is None:
+                # Rebuilt on the next search; searches keep the old snapshot till then
+                self._loaded_at = float("-inf")
+            else:
+                self._stale.update(product_ids)
+
+    # ---------- Querying ----------
+
+    @staticmethod
+    def _match_text(index, query):
+        """{product_id: score} for products matching every query term."""
+        scores = None
+        for term in tokenize(query):
+            term_scores = defaultdict(int)
+            # Terms match whole words (2 points) or word prefixes (1 point)
+            start = bisect.bisect_left(index.vocabulary, term)
+            for token in index.vocabulary[start:]:
+                if not token.startswith(term):
+                    break
+                for pk in index.postings.get(token, ()):
+                    term_scores[pk] = max(term_scores[pk], 2 if token == term else 1)
+            if scores is None:
+                scores = dict(term_scores)
+            else:
+                scores = {pk: score + term_scores[pk] for pk, score in scores.items() if pk in term_scores}
+            if not scores:
+                break
+        return scores
+
+    @staticmethod
+    def _price_range(index, min_price, max_price):
+        low = bisect.bisect_left(index.prices, (min_price, -1)) if min_price is not None else 0
+        high = bisect.bisect_right(index.prices, (max_price, float("inf"))) if max_price is not None else len(index.prices)
+        return {pk for _, pk in index.prices[low:high]}
+
+    def search(self, query="", classifications=(), sizes=(), min_price=None, max_price=None,
+               in_stock=False, sort="relevance", limit=24, offset=0):
+        """
+        Products matching all the given filters, plus facet counts. Each
+        facet is counted with every other filter applied but not its own,
+        so the counts show what selecting another value would return.
+        """
+        index = self._ensure_fresh()
+        docs = index.docs
+        scores = self._match_text(index, query) if query and query.strip() else None
+
+        filters = {}
+        if scores is not None:
+            filters["q"] = set(scores)
+        if classifications:
+            filters["classification"] = set().union(*(index.by_classification.get(c, ()) for c in classifications))
+        if sizes:
+            filters["size"] = set().union(*(index.by_size.get(s, ()) for s in sizes))
+        if min_price is not None or max_price is not None:
+            filters["price"] = self._price_range(index, min_price, max_price)
+        if in_stock:
+            filters["in_stock"] = index.in_stock
+
+        def matching(skip=None):
+            selected = [ids for name, ids in filters.items() if name != skip]
+            if not selected:
+                return set(docs)
+            selected.sort(key=len)
+            return set(selected[0]).intersection(*selected[1:])
+
+        hits = matching()
+        facets = {
+            "classification": self._count(docs, matching("classification"), _classifications),
+            "sizes": self._count(docs, matching("size"), lambda doc: doc["sizes"]),
+            "price": self._price_stats(docs, matching("price")),
+        }
+
+        order = {
+            "price": lambda pk: (docs[pk]["price"], pk),
+            "-price": lambda pk: (-docs[pk]["price"], pk),
+            "name": lambda pk: ((docs[pk]["name"] or "").lower(), pk),
+            "newest": lambda pk: -pk,
+        }.get(sort) or (lambda pk: (-scores[pk], pk) if scores else pk)
+        ranked = sorted(hits, key=order)[offset:offset + limit]
+
+        return {
+            "count": len(hits),
+            "results": [self._public(docs[pk]) for pk in ranked],
+            "facets": facets,
+        }
+
+    @staticmethod
+    def _count(docs, ids, values):
+        counts = defaultdict(int)
+        for pk in ids:
+            for value in values(docs[pk]):
+                counts[value] += 1
+        return dict(sorted(counts.items()))
+
+    @staticmethod
+    def _price_stats(docs, ids):
+        prices = [docs[pk]["price"] for pk in ids]
+        return {"min": min(prices), "max": max(prices)} if prices else {"min": None, "max": None}
+
+    @staticmethod
+    def _public(doc):
+        from django.core.files.storage import default_storage
+
+        return {
+            "id": doc["id"],
+            "name": doc["name"],
+            "price": doc["price"],
+            "compare_price": doc["compare_price"],
+            "classification": doc["classification"],
+            "best_seller": bool(doc["best_seller"]),
+            "image": default_storage.url(doc["image"]) if doc["image"] else None,
+            "in_stock": doc["total_stock"] > 0,
+            "sizes": doc["sizes"],
+        }
+
+
+search_index = SearchIndex()
@@ -0,0 +1,120 @@
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from store.utils.order_numbers import reserve_block
+from store.utils.sales import rebuild_sales_rollup
+
+LETTER_SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+WAIST_SIZES = ['30', '32', '33', '34', '36', '38', '40', '42', '44', '46']
+CLASSIFICATIONS = ['tshirts'] * 4 + ['shorts'] * 3 + ['trouser'] * 2 + ['suit'] + ['best-sellers']
+ADJECTIVES = ['Classic', 'Slim', 'Relaxed', 'Linen', 'Cotton', 'Vintage', 'Urban', 'Summer', 'Washed', 'Heavy']
+COLOURS = ['Black', 'White', 'Navy', 'Olive', 'Sand', 'Grey', 'Rust', 'Sky', 'Bottle', 'Stone']
+NOUNS = {'tshirts': 'Tee', 'shorts': 'Shorts', 'trouser': 'Trouser', 'suit': 'Suit', 'best-sellers': 'Polo'}
+AREAS = ['Maadi', 'Zamalek', 'Heliopolis', 'Nasr City', 'Dokki', 'Mohandessin', 'New Cairo', 'Sheikh Zayed', '6th of October', 'Giza']
+NAMES = ['Ahmed', 'Mohamed', 'Omar', 'Youssef', 'Mariam', 'Nour', 'Salma', 'Hana', 'Karim', 'Laila']
+# Most history is delivered; recent orders are still moving through
+STATUSES = ['delivered'] * 70 + ['shipped'] * 10 + ['cancelled'] * 8 + ['processing'] * 7 + ['pending'] * 5
+
+
+def _sizes_for(classification):
+    return WAIST_SIZES if classification in ('trouser', 'suit') else LETTER_SIZES
+
+
+def seed_store(products=200, orders=1000, days=365, seed=42, batch_size=2000):
+    """
+    Fill the current database with a synthetic catalog and order history:
+    `products` products with a realistic spread of sizes and stock
+    (including sold-out sizes and products), and `orders` orders of one to
+    four lines spread over the past `days` days. Rows are written with bulk
+    operations in batches; stock_changed is sent once for every product so
+    the derived stock columns, indexes and catalog version stay correct.
+    Order numbers are reserved from the counter, so checkouts placed
+    afterwards continue the sequence.
+
+    Returns a dict of row counts.
+    """
+    from store.models import Order, OrderItem, Products, ProductSize
+    from store.signals import stock_changed
+
+    rng = random.Random(seed)
+
+    with transaction.atomic():
+        catalog = []
+        for i in range(products):
+            classification = rng.choice(CLASSIFICATIONS)
+            price = rng.randrange(250, 3000, 50)
+            catalog.append(Products(
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(COLOURS)} {NOUNS[classification]} {i}'[:30],
+                classification=classification,
+                price=price,
+                compare_price=price + rng.randrange(100, 500, 50) if rng.random() < 0.2 else None,
+                best_seller=rng.random() < 0.1,
+            ))
+        catalog = Products.objects.bulk_create(catalog, batch_size=batch_size)
+
+        sizes = []
+        for product in catalog:
+            offered = _sizes_for(product.classification)
+            # A few products are sold out entirely; the rest carry a run of
+            # sizes, some of them at zero
+            sold_out = rng.random() < 0.05
+            for size in offered[rng.randrange(0, 2):len(offered) - rng.randrange(0, 2)]:
+                stock = 0 if sold_out or rng.random() < 0.1 else rng.randint(1, 60)
+                sizes.append(ProductSize(product=product, size=size, stock_count=stock))
+        ProductSize.objects.bulk_create(sizes, batch_size=batch_size)
+        stock_changed.send(sender=ProductSize, product_ids={p.pk for p in catalog})
+
+        if not catalog:
+            orders = 0
+        item_count = 0
+        if orders:
+            first_number, _ = reserve_block(orders)
+            now = timezone.now()
+            span = timedelta(days=days).total_seconds()
+            offered_sizes = {p.pk: _sizes_for(p.classification) for p in catalog}
+            for start in range(0, orders, batch_size):
+                count = min(batch_size, orders - start)
+                batch, lines, stamps = [], [], []
+                for offset in range(start, start + count):
+                    # Orders arrive in time order, as they do in production
+                    created = now - timedelta(seconds=span * (orders - offset) / orders - rng.random())
+                    picked = rng.sample(catalog, min(len(catalog), rng.randint(1, 4)))
+                    order_lines = [
+                        (product, rng.choice(offered_sizes[product.pk]), rng.randint(1, 3))
+                        for product in picked
+                    ]
+                    batch.append(Order(
+                        order_number=str(first_number + offset),
+                        first_name=rng.choice(NAMES),
+                        phone=f'01{rng.choice("0125")}{rng.randrange(10**8):08d}',
+                        address=f'{rng.randint(1, 200)} Street {rng.randint(1, 90)}',
+                        area=rng.choice(AREAS),
+                        nearest_landmark='',
+                        status=rng.choice(STATUSES),
+                        total_amount=sum(product.price * qty for product, _, qty in order_lines),
+                    ))
+                    lines.append(order_lines)
+                    stamps.append(created)
+                batch = Order.objects.bulk_create(batch)
+                # created_at/updated_at are auto_now fields, which bulk_create
+                # stamps with the current time; put the history back
+                for order, created in zip(batch, stamps):
+                    order.created_at = order.updated_at = created
+                Order.objects.bulk_update(batch, ['created_at', 'updated_at'])
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order, product=product, size=size, quantity=qty, price=product.price,
+                        classification=product.classification,
+                    )
+                    for order, order_lines in zip(batch, lines)
+                    for product, size, qty in order_lines
+                ])
+                item_count += sum(len(order_lines) for order_lines in lines)
+
+        # Bulk inserts skip the order signals that keep the sales rollup
+        rebuild_sales_rollup()
+
+    return {'products': len(catalog), 'sizes': len(sizes), 'orders': orders, 'items': item_count}
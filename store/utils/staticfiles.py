@@ -0,0 +1,272 @@
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".map", ".txt", ".html", ".xml")
+MIN_COMPRESS_SIZE = 256
+# Names written by ManifestStaticFilesStorage carry a 12-digit content hash
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^./]+(\.gz)?$")
+
+
+# ---------- Minifiers ----------
+# Deliberately conservative: comments and redundant whitespace go, every
+# string, template literal and regex literal is copied through untouched,
+# and JS line breaks are kept so automatic semicolon insertion still works.
+
+def _skip_string(text, i):
+    quote = text[i]
+    i += 1
+    while i < len(text) and text[i] != quote:
+        i += 2 if text[i] == "\\" else 1
+    return i + 1
+
+
+def minify_css(text):
+    out = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = len(text) if end == -1 else end + 2
+            continue
+        if char in "\"'":
+            end = _skip_string(text, i)
+            out.append(text[i:end])
+            i = end
+            continue
+        if char.isspace():
+            while i < len(text) and text[i].isspace():
+                i += 1
+            previous = out[-1][-1:] if out else ""
+            if previous and previous not in "{};,:>" and i < len(text) and text[i] not in "{};,>!":
+                out.append(" ")
+            continue
+        if char == "}" and out and out[-1] == ";":
+            out.pop()
+        out.append(char)
+        i += 1
+    return "".join(out).strip() + "\n"
+
+
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case", "do", "else", "yield", "await"}
+
+
+def _is_word(char):
+    return char.isalnum() or char in "_$\\" or ord(char) > 127
+
+
+def _skip_template(text, i):
+    """Index just past the template literal starting at text[i]."""
+    i += 1
+    while i < len(text):
+        char = text[i]
+        if char == "\\":
+            i += 2
+        elif char == "`":
+            return i + 1
+        elif text.startswith("${", i):
+            i = _skip_braces(text, i + 2)
+        else:
+            i += 1
+    return i
+
+
+def _skip_braces(text, i):
+    """Index just past the `}` closing a `${` expression that starts at i."""
+    depth = 1
+    while i < len(text) and depth:
+        char = text[i]
+        if char in "\"'":
+            i = _skip_string(text, i)
+        elif char == "`":
+            i = _skip_template(text, i)
+        else:
+            depth += {"{": 1, "}": -1}.get(char, 0)
+            i += 1
+    return i
+
+
+def _skip_regex(text, i):
+    i += 1
+    in_class = False
+    while i < len(text) and text[i] != "\n":
+        char = text[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "/" and not in_class:
+            i += 1
+            while i < len(text) and _is_word(text[i]):
+                i += 1
+            return i
+        i += 1
+    return i
+
+
+def minify_js(text):
+    out = []
+    last_token = ""
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if text.startswith("//", i):
+            end = text.find("\n", i)
+            i = len(text) if end == -1 else end
+            continue
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            end = len(text) if end == -1 else end + 2
+            # A comment spanning lines still ends a statement for ASI
+            if "\n" in text[i:end] and out and out[-1] != "\n":
+                out.append("\n")
+            i = end
+            continue
+        if char.isspace():
+            start = i
+            while i < len(text) and text[i].isspace():
+                i += 1
+            previous = out[-1][-1:] if out else ""
+            following = text[i:i + 1]
+            if not previous or not following:
+                continue
+            if "\n" in text[start:i]:
+                out.append("\n")
+            elif (_is_word(previous) and _is_word(following)) or (previous + following in ("++", "--", "+-", "-+", "//")):
+                out.append(" ")
+            continue
+        if char in "\"'":
+            end = _skip_string(text, i)
+        elif char == "`":
+            end = _skip_template(text, i)
+        elif char == "/" and (not last_token or last_token in _REGEX_PRECEDERS or last_token in _REGEX_KEYWORDS):
+            end = _skip_regex(text, i)
+        elif _is_word(char):
+            end = i
+            while end < len(text) and _is_word(text[end]):
+                end += 1
+        else:
+            end = i + 1
+        token = text[i:end]
+        out.append(token)
+        last_token = token if _is_word(char) or len(token) == 1 else ")"
+        i = end
+    return "".join(out).strip() + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+def minify(name, content):
+    """Minified `content` for `name`, or None if it should be left alone."""
+    root, ext = os.path.splitext(name)
+    if ext not in MINIFIERS or root.endswith(".min"):
+        return None
+    return MINIFIERS[ext](content)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    `collectstatic` storage that minifies CSS and JS, writes content-hashed
+    copies (see ManifestStaticFilesStorage) and a `.gz` sibling next to every
+    compressible file. Templates keep using {% static %}; URLs fall back to
+    the plain name when a file has not been collected yet.
+    """
+
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run, **options)
+            return
+
+        if getattr(settings, "STATIC_MINIFY", True):
+            for name in list(paths):
+                source_storage, path = paths[name]
+                if os.path.splitext(name)[1] not in MINIFIERS:
+                    continue
+                with source_storage.open(path) as fh:
+                    original = fh.read().decode("utf-8")
+                minified = minify(name, original)
+                if minified is not None and len(minified) < len(original):
+                    # Hash the minified copy rather than the source file
+                    self.delete(name)
+                    self._save(name, ContentFile(minified.encode("utf-8")))
+                    paths[name] = (self, name)
+
+        processed = list(super().post_process(paths, dry_run, **options))
+        yield from processed
+
+        for name, hashed_name, _ in processed:
+            for target in {name, hashed_name}:
+                if target and not isinstance(target, Exception):
+                    self.write_gzip(target)
+
+    def write_gzip(self, name):
+        if not name.endswith(COMPRESSIBLE) or not self.exists(name):
+            return
+        with self.open(name) as fh:
+            data = fh.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            if self.exists(name + ".gz"):
+                self.delete(name + ".gz")
+            self._save(name + ".gz", ContentFile(compressed))
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected yet (tests, fresh checkouts): serve the plain name
+            return name
+
+
+def serve_static(request, path):
+    """
+    Serve collected files from STATIC_ROOT, preferring the `.gz` sibling
+    when the client accepts gzip. Hashed names never change content, so
+    they are marked immutable for a year; anything else must revalidate.
+    """
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404("Not found")
+    if not os.path.isfile(fullpath):
+        raise Http404("Not found")
+
+    stat = os.stat(fullpath)
+    if not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(fullpath)
+    encoding = None
+    served = fullpath
+    if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "") and os.path.isfile(fullpath + ".gz"):
+        served, encoding = fullpath + ".gz", "gzip"
+
+    response = FileResponse(open(served, "rb"), content_type=content_type or "application/octet-stream")
+    if encoding:
+        response["Content-Encoding"] = encoding
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Vary"] = "Accept-Encoding"
+    if HASHED_NAME.search(path):
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response["Cache-Control"] = "public, max-age=0, must-revalidate"
+    return response
@@ -0,0 +1,91 @@
+from django.db import transaction
+
+LOW_STOCK_THRESHOLD = 5
+SHOWN = 5
+SUMMARY_PK = 1
+
+
+def build_stock_alerts():
+    """
+    Scan the catalog once for the admin stock banner. Each section keeps its
+    total count and the first few entries to display; `product_ids` lists
+    every product mentioned so later changes can tell if they matter.
+    """
+    from store.models import Products, ProductSize
+
+    out_of_stock = list(Products.objects.filter(total_stock__lte=0).order_by("pk").values_list("pk", "name"))
+    sizes = list(
+        ProductSize.objects.filter(stock_count__lte=LOW_STOCK_THRESHOLD)
+        .order_by("pk")
+        .values_list("product_id", "product__name", "size", "stock_count")
+    )
+    size_labels = dict(ProductSize.SIZE_CHOICES)
+
+    def size_entry(row):
+        product_id, name, size, stock = row
+        return {"product_id": product_id, "name": name, "size": size_labels.get(size, size), "stock": stock}
+
+    zero = [row for row in sizes if row[3] <= 0]
+    low = [row for row in sizes if row[3] > 0]
+    return {
+        "out_of_stock": {
+            "count": len(out_of_stock),
+            "items": [{"product_id": pk, "name": name} for pk, name in out_of_stock[:SHOWN]],
+        },
+        "zero_sizes": {"count": len(zero), "items": [size_entry(row) for row in zero[:SHOWN]]},
+        "low_sizes": {"count": len(low), "items": [size_entry(row) for row in low[:SHOWN]]},
+        "product_ids": sorted({pk for pk, _ in out_of_stock} | {row[0] for row in sizes}),
+    }
+
+
+def refresh_stock_alerts():
+    from store.models import StockAlertSummary
+
+    data = build_stock_alerts()
+    StockAlertSummary.objects.update_or_create(pk=SUMMARY_PK, defaults={"data": data})
+    return data
+
+
+def get_stock_alerts():
+    """The banner data: one primary-key read, or a build if none exists or it went stale."""
+    from store.models import StockAlertSummary
+
+    summary = StockAlertSummary.objects.filter(pk=SUMMARY_PK).values_list("data", flat=True).first()
+    return summary if summary is not None else refresh_stock_alerts()
+
+
+def stock_alerts_affected(product_ids):
+    """
+    Whether a change to these products can alter the banner: they are already
+    listed, or one of them now has a size at or under the low-stock threshold
+    (or no sized stock at all).
+    """
+    from store.models import Products, ProductSize, StockAlertSummary
+
+    summary = StockAlertSummary.objects.filter(pk=SUMMARY_PK).values_list("data", flat=True).first()
+    if summary is None or set(summary.get("product_ids", [])) & set(product_ids):
+        return True
+    if ProductSize.objects.filter(product_id__in=product_ids, stock_count__lte=LOW_STOCK_THRESHOLD).exists():
+        return True
+    return Products.objects.filter(pk__in=product_ids, total_stock__lte=0).exists()
+
+
+def invalidate_stock_alerts():
+    """Drop the summary; the next get_stock_alerts() rebuilds it."""
+    from store.models import StockAlertSummary
+
+    StockAlertSummary.objects.filter(pk=SUMMARY_PK).delete()
+
+
+def schedule_stock_alert_invalidation(product_ids=None):
+    """
+    Mark the summary stale after the current transaction commits, if the
+    change can alter it. The catalog scan waits for the next admin page
+    that shows the banner, so checkout and other storefront requests only
+    pay for the cheap stock_alerts_affected() check.
+    """
+    def invalidate():
+        if product_ids is None or stock_alerts_affected(product_ids):
+            invalidate_stock_alerts()
+
+    transaction.on_commit(invalidate)
@@ -0,0 +1,174 @@
+import csv
+from collections import defaultdict
+
+from django.db import transaction
+
+BATCH_SIZE = 1000
+MAX_ERRORS = 20
+
+
+class StockImportError(Exception):
+    """The CSV cannot be imported; `errors` lists what is wrong with it."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+class StockImport:
+    """What importing a stock CSV does (or did) to ProductSize."""
+
+    def __init__(self):
+        self.creates = []    # (product_id, name, size, stock)
+        self.updates = []    # (pk, product_id, name, size, old stock, new stock)
+        self.unchanged = 0
+
+    @property
+    def product_ids(self):
+        return {row[0] for row in self.creates} | {row[1] for row in self.updates}
+
+    def changes(self):
+        """(product_id, name, size, old stock or None when created, new stock), by product and size."""
+        rows = [(product_id, name, size, None, stock) for product_id, name, size, stock in self.creates]
+        rows += [(product_id, name, size, old, new) for _, product_id, name, size, old, new in self.updates]
+        return sorted(rows, key=lambda row: (row[1] or "", row[0], row[2]))
+
+
+def _whole(value):
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return number if number >= 0 else None
+
+
+def read_stock_csv(lines):
+    """
+    {(product_id, size): stock} from CSV lines with a header row. Products
+    are given by `product_id`, or by `product` (the exact name) when the
+    id column is empty or missing; `size` must be one of
+    ProductSize.SIZE_CHOICES and `stock` a whole number of at least 0.
+    Raises StockImportError listing the bad lines (MAX_ERRORS at most).
+    """
+    from store.models import Products, ProductSize
+
+    reader = csv.DictReader(lines)
+    columns = {name.strip().lower() for name in reader.fieldnames or ()}
+    if not {"size", "stock"} <= columns or not columns & {"product_id", "product"}:
+        raise StockImportError(["The header must have product_id (or product), size and stock columns."])
+
+    names = {}
+    pks = set()
+    for pk, name in Products.objects.values_list("pk", "name"):
+        pks.add(pk)
+        names.setdefault(name, []).append(pk)
+    sizes = {value for value, _ in ProductSize.SIZE_CHOICES}
+
+    stock, errors = {}, []
+    for row in reader:
+        if len(errors) >= MAX_ERRORS:
+            break
+        row = {(key or "").strip().lower(): (value or "").strip() for key, value in row.items() if key}
+        if not any(row.values()):
+            continue
+        line = f"Line {reader.line_num}"
+        product_id, name = row.get("product_id", ""), row.get("product", "")
+        if product_id:
+            product_id = _whole(product_id)
+            if product_id not in pks:
+                errors.append(f"{line}: no product with id {row['product_id']!r}.")
+                continue
+        elif len(names.get(name, ())) == 1:
+            product_id = names[name][0]
+        else:
+            found = "several products" if name in names else "no product"
+            errors.append(f"{line}: {found} named {name!r}; give its product_id.")
+            continue
+        if row["size"] not in sizes:
+            errors.append(f"{line}: unknown size {row['size']!r}.")
+            continue
+        count = _whole(row["stock"])
+        if count is None:
+            errors.append(f"{line}: stock must be a whole number of at least 0, not {row['stock']!r}.")
+            continue
+        key = (product_id, row["size"])
+        if key in stock:
+            errors.append(f"{line}: product {product_id} size {row['size']} is listed twice.")
+            continue
+        stock[key] = count
+
+    if errors:
+        raise StockImportError(errors[:MAX_ERRORS])
+    return stock
+
+
+def plan_stock_import(stock):
+    """
+    Compare {(product_id, size): stock} with ProductSize, reading (and,
+    inside a transaction, locking) the rows involved in batches.
+    """
+    from store.models import Products, ProductSize
+
+    by_product = defaultdict(dict)
+    for (product_id, size), count in stock.items():
+        by_product[product_id][size] = count
+
+    plan = StockImport()
+    product_ids = sorted(by_product)
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        batch = product_ids[start:start + BATCH_SIZE]
+        names = dict(Products.objects.filter(pk__in=batch).values_list("pk", "name"))
+        existing = {
+            (product_id, size): (pk, count)
+            for pk, product_id, size, count in ProductSize.objects.select_for_update()
+            .filter(product_id__in=batch).values_list("pk", "product_id", "size", "stock_count")
+        }
+        for product_id in batch:
+            for size, count in by_product[product_id].items():
+                current = existing.get((product_id, size))
+                if current is None:
+                    plan.creates.append((product_id, names.get(product_id), size, count))
+                elif current[1] != count:
+                    plan.updates.append((current[0], product_id, names.get(product_id), size, current[1], count))
+                else:
+                    plan.unchanged += 1
+    return plan
+
+
+def import_stock(lines, dry_run=False):
+    """
+    Set ProductSize stock from CSV `lines` (see read_stock_csv), creating
+    missing sizes: the rows are upserted on (product, size) with batched
+    INSERTs and UPDATEs in one transaction, then stock_changed is sent
+    once for every product touched. Sizes not in the file are left alone.
+    The figures are units on the shelf, like stock_count in the admin;
+    units held in carts are counted apart (ProductSize.held) and still
+    come out of them.
+
+    With `dry_run` nothing is written. Returns the StockImport either way;
+    raises StockImportError, writing nothing, if any line is invalid.
+    """
+    from store.models import ProductSize
+    from store.signals import stock_changed
+
+    stock = read_stock_csv(lines)
+    with transaction.atomic():
+        plan = plan_stock_import(stock)
+        if dry_run:
+            return plan
+        ProductSize.objects.bulk_create(
+            [ProductSize(product_id=product_id, size=size, stock_count=count)
+             for product_id, _, size, count in plan.creates],
+            batch_size=BATCH_SIZE,
+        )
+        # Stock figures repeat a lot, so one UPDATE ... WHERE id IN (...) per
+        # figure and batch beats bulk_update's CASE over every row
+        by_count = defaultdict(list)
+        for pk, _, _, _, _, new in plan.updates:
+            by_count[new].append(pk)
+        for count, pks in by_count.items():
+            for start in range(0, len(pks), BATCH_SIZE):
+                ProductSize.objects.filter(pk__in=pks[start:start + BATCH_SIZE]).update(stock_count=count)
+        if plan.product_ids:
+            stock_changed.send(sender=ProductSize, product_ids=plan.product_ids)
+    return plan
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from store.utils.catalog_version import row_digest
+
+
+class StockIndex:
+    """
+    In-process copy of the units free to sell (stock_count less held) keyed
+    by (product_id, size).
+
+    The whole table is loaded with one query on first use. Changes made in
+    this process (see store.signals.stock_changed and holds_changed) mark
+    the affected products stale, and they are re-read together on the next
+    lookup. Changes made by
+    other processes are picked up when the copy expires after
+    STOCK_INDEX_TTL seconds. Answers are advisory: place_order still checks
+    stock under lock. fingerprint() identifies the rows loaded, for ETags of
+    pages rendered from them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (sizes by product, free units by (product_id, size), fingerprint),
+        # or None until loaded. Readers take it without the lock, so a reload
+        # builds new dicts and publishes them with one assignment.
+        self._index = None
+        self._stale = set()
+        self._loaded_at = 0.0
+
+    def _fetch(self, product_ids=None):
+        from store.models import ProductSize
+
+        rows = ProductSize.objects.only("id", "product_id", "size", "stock_count", "held").order_by("id")
+        if product_ids is not None:
+            rows = rows.filter(product_id__in=product_ids)
+        sizes = defaultdict(list)
+        for product_size in rows:
+            sizes[product_size.product_id].append(product_size)
+        return sizes
+
+    @staticmethod
+    def _digest(product_size):
+        return row_digest(product_size.product_id, product_size.size, product_size.stock_count, product_size.held)
+
+    def _needs_refresh(self):
+        ttl = getattr(settings, "STOCK_INDEX_TTL", 30)
+        return self._index is None or bool(self._stale) or time.monotonic() - self._loaded_at > ttl
+
+    def _ensure_fresh(self):
+        ttl = getattr(settings, "STOCK_INDEX_TTL", 30)
+        with self._lock:
+            if self._index is None or time.monotonic() - self._loaded_at > ttl:
+                sizes = dict(self._fetch())
+                stock = {
+                    (product_id, product_size.size): product_size.available
+                    for product_id, product_sizes in sizes.items()
+                    for product_size in product_sizes
+                }
+                fingerprint = 0
+                for product_sizes in sizes.values():
+                    for product_size in product_sizes:
+                        fingerprint ^= self._digest(product_size)
+                self._stale.clear()
+                self._index = (sizes, stock, fingerprint)
+                self._loaded_at = time.monotonic()
+            elif self._stale:
+                sizes, stock, fingerprint = self._index
+                fresh = self._fetch(self._stale)
+                for product_id in self._stale:
+                    product_sizes = fresh.get(product_id, [])
+                    for product_size in sizes.get(product_id, []) + product_sizes:
+                        fingerprint ^= self._digest(product_size)
+                    # New values first, then the sizes that went away, so a
+                    # concurrent reader never misses a size that still exists
+                    for product_size in product_sizes:
+                        stock[(product_id, product_size.size)] = product_size.available
+                    current = {product_size.size for product_size in product_sizes}
+                    for product_size in sizes.get(product_id, []):
+                        if product_size.size not in current:
+                            stock.pop((product_id, product_size.size), None)
+                    if product_sizes:
+                        sizes[product_id] = product_sizes
+                    else:
+                        sizes.pop(product_id, None)
+                self._stale.clear()
+                self._index = (sizes, stock, fingerprint)
+            return self._index
+
+    def sizes(self, product_id):
+        """The product's ProductSize rows (id, size, stock_count and held only)."""
+        return self._ensure_fresh()[0].get(product_id, [])
+
+    def fingerprint(self):
+        """Hex digest of the rows loaded, equal in every process that loaded the same rows."""
+        return f"{self._ensure_fresh()[2]:016x}"
+
+    def stock(self, product_id, size):
+        """Units free to sell for (product_id, size), or None if the size does not exist."""
+        return self._ensure_fresh()[1].get((product_id, size))
+
+    async def astock(self, product_id, size):
+        """stock() for async views; only a reload leaves the event loop."""
+        index = self._index
+        if index is None or self._needs_refresh():
+            index = await sync_to_async(self._ensure_fresh)()
+        return index[1].get((product_id, size))
+
+    def invalidate(self, product_ids=None):
+        with self._lock:
+            if product_ids is None:
+                # Reloaded on the next lookup; readers keep the old copy till then
+                self._loaded_at = float("-inf")
+            else:
+                self._stale.update(product_ids)
+
+
+stock_index = StockIndex()
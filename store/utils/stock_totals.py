@@ -0,0 +1,39 @@
+from collections import defaultdict
+
+
+def compute_stock_totals(product_ids=None):
+    """
+    {product_id: (total_stock, available_sizes)} computed from ProductSize
+    with one query. Products without any size are included as (0, "")
+    when `product_ids` is given.
+    """
+    from store.models import ProductSize
+
+    rows = ProductSize.objects.order_by("id").values_list("product_id", "size", "stock_count")
+    if product_ids is not None:
+        rows = rows.filter(product_id__in=product_ids)
+    totals = defaultdict(int)
+    sizes = defaultdict(list)
+    for product_id, size, stock in rows:
+        totals[product_id] += max(stock, 0)
+        if stock > 0:
+            sizes[product_id].append(size)
+    ids = set(product_ids) if product_ids is not None else set(totals)
+    return {pk: (totals.get(pk, 0), ", ".join(sizes.get(pk, []))) for pk in ids}
+
+
+def refresh_stock_totals(product_ids):
+    """Recompute Products.total_stock/available_sizes for these products."""
+    from store.models import Products
+
+    computed = compute_stock_totals(product_ids)
+    products = list(Products.objects.filter(pk__in=computed).only("id", "total_stock", "available_sizes"))
+    changed = []
+    for product in products:
+        total, sizes = computed[product.pk]
+        if (product.total_stock, product.available_sizes) != (total, sizes):
+            product.total_stock, product.available_sizes = total, sizes
+            changed.append(product)
+    if changed:
+        Products.objects.bulk_update(changed, ["total_stock", "available_sizes"])
+    return changed
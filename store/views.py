@@ -1,137 +1,182 @@
+import logging
+
 from django.shortcuts import render
 from django.shortcuts import render, redirect
-from .utils.cart import get_cart, save_cart
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from .utils.cart import Cart, aget_cart, get_cart, save_cart
+from .utils.order_numbers import allocate_order_number
+from .utils.orders import InsufficientStock, create_order_items
+from .utils.holds import amaybe_release_expired_holds, holds_enabled, place_hold, release_hold
+from .utils.stock_index import stock_index
+from .utils.db import atomic_with_retry, is_transient
+from .utils.catalog_version import catalog_etag, stock_storefront_condition, storefront_condition
+from .utils.perf import metrics as request_metrics
+from django.conf import settings
+from django.db.models import Q
+from django.views.decorators.http import condition
+from django.views.decorators.cache import cache_control
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils.crypto import constant_time_compare
 from django.contrib import messages
-from django.db import transaction  
-from .models import Products, Order, OrderItem, ProductSize
+from .models import Products, Order
+
+logger = logging.getLogger(__name__)
 
 
+@cache_control(no_cache=True)
+@storefront_condition
 def home(request):
     return render(request, 'store/index.html')
 
-def products(request):
-    products = Products.objects.all()
-    session_cart = get_cart(request.session)
+# Storefront sections: slug (also the CSS prefix), title, which products
+# belong to it and whether cards offer a size picker
+CATALOG_SECTIONS = [
+    ('best-sellers', 'Best Sellers', Q(best_seller=True) | Q(classification='best-sellers'), False),
+    ('tshirts', 'T-Shirts', Q(classification='tshirts'), True),
+    ('shorts', 'Shorts', Q(classification='shorts'), True),
+    ('trousers', 'Trousers', Q(classification='trouser'), True),
+    ('suits', 'Suits', Q(classification='suit'), True),
+]
 
-    best_sellers, tshirts, shorts, suits, trousers = [], [], [], [], []
 
-    for p in products:
-        if getattr(p, "best_seller", False) or p.classification == 'best_sellers':
-            best_sellers.append(p)
+def section_page(section, after=0):
+    """
+    One page of a section's products after product id `after`, and the id
+    to continue from (None on the last page). One indexed, limited query.
+    """
+    slug, title, lookup, show_sizes = section
+    size = getattr(settings, 'CATALOG_SECTION_SIZE', 12)
+    page = list(Products.objects.filter(lookup, pk__gt=after).order_by('id')[:size + 1])
+    more = len(page) > size
+    page = page[:size]
+    # Sizes and stock come from the in-process stock index, so the cards
+    # never hit the database
+    for p in page:
+        p.sizes = stock_index.sizes(p.pk)
+        p.in_stock = any(ps.is_in_stock for ps in p.sizes)
+    return page, (page[-1].pk if more else None)
 
-        if p.classification == 'tshirts':
-            tshirts.append(p)
 
-        if p.classification == 'shorts':
-            shorts.append(p)
+@cache_control(no_cache=True)
+@stock_storefront_condition
+def products(request):
+    # Only each section's first page is rendered; the rest is fetched from
+    # product_section as the carousel scrolls
+    sections = []
+    for section in CATALOG_SECTIONS:
+        page, next_after = section_page(section)
+        if page:
+            sections.append({
+                'slug': section[0],
+                'title': section[1],
+                'show_sizes': section[3],
+                'products': page,
+                'next_after': next_after,
+            })
 
-        if p.classification == 'suit':
-            suits.append(p)
+    return render(request, 'store/products.html', {
+        'sections': sections,
+        'cart': get_cart(request).to_client()
+    })
 
-        if p.classification == 'trouser':
-            trousers.append(p)
 
-    return render(request, 'store/products.html', {
-        'best_sellers': best_sellers,
-        'tshirts': tshirts,
-        'shorts': shorts,
-        'trousers': trousers,
-        'suits': suits,
-        'cart': session_cart
+@cache_control(no_cache=True)
+@condition(etag_func=catalog_etag)
+def product_section(request, slug):
+    """
+    The next product cards of a storefront section as an HTML fragment.
+    X-Next-After holds the `after` value for the following page, or is
+    empty on the last one.
+    """
+    section = next((s for s in CATALOG_SECTIONS if s[0] == slug), None)
+    if section is None:
+        raise Http404("Unknown section")
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        return HttpResponseBadRequest("after must be a product id")
+
+    page, next_after = section_page(section, after)
+    response = render(request, 'store/partials/product_cards.html', {
+        'products': page,
+        'show_sizes': section[3],
     })
+    response['X-Next-After'] = next_after or ''
+    return response
+
+# The cart endpoints are async so that, under ASGI (hunters.asgi), a burst
+# of cart clicks waits on the database without holding a worker thread
+# each. Stock holds need a transaction, which the async ORM cannot open, so
+# they still run in a thread.
 
-def get_session_cart(request):
-    session_cart = get_cart(request.session)
-    if session_cart:
-        return JsonResponse({"cart": session_cart})
+async def cart_summary(request):
+    cart = await aget_cart(request)
+    return JsonResponse({"ok": True, "cart": await cart.ato_client()})
 
-def add_to_cart(request):
+async def add_to_cart(request):
     product_id = int(request.POST['product_id'])
     size = request.POST.get('size', '')  # Get size if provided
-    qty = int(request.POST.get('qty', 1))
-
-    product = Products.objects.get(pk=product_id)
-    unit_price = product.price
+    try:
+        qty = int(request.POST.get('qty', 1))
+    except ValueError:
+        return HttpResponseBadRequest("qty must be a whole number")
+    if qty < 1:
+        return HttpResponseBadRequest("qty must be at least 1")
 
-    # If size is provided, check stock in ProductSize
+    # If size is provided, check stock against the in-process index
     if size:
-        try:
-            product_size = ProductSize.objects.get(product_id=product_id, size=size)
-            if product_size.stock_count < qty:
-                return JsonResponse({"ok": False, "error": f"Only {product_size.stock_count} items available in size {size}"})
-        except ProductSize.DoesNotExist:
+        in_stock = await stock_index.astock(product_id, size)
+        if in_stock is None:
             return JsonResponse({"ok": False, "error": "This size is not available"})
+        if in_stock < qty:
+            return JsonResponse({"ok": False, "error": f"Only {in_stock} items available in size {size}"})
 
-    cart = get_cart(request.session)
+    cart = await aget_cart(request)
 
-    # Create unique cart item identifier (include size if present)
-    cart_item_key = f"{product_id}_{size}" if size else str(product_id)
+    # Existing lines keep their price snapshot, so only new lines read the price
+    unit_price = None
+    if not cart.quantity(product_id, size):
+        unit_price = await Products.objects.values_list('price', flat=True).aget(pk=product_id)
 
-    for item in cart['items']:
-        # Check both product_id and size for existing items
-        existing_key = f"{item['product_id']}_{item.get('size', '')}" if item.get('size') else str(item['product_id'])
-        if existing_key == cart_item_key:
-            item['qty'] += qty
-            save_cart(request.session, cart)
-            return JsonResponse({"ok": True, "cart": cart})
-    
-    # Create new cart item
-    cart_item = {
-        "product_id": product_id,
-        "name": product.name,
-        "qty": qty,
-        "unit_price": str(unit_price),
-        "image_url": product.image.url if product.image else "",
-    }
-    
-    # Add size info if provided
-    if size:
-        cart_item["size"] = size
-        try:
-            product_size = ProductSize.objects.get(product_id=product_id, size=size)
-            cart_item["size_display"] = product_size.get_size_display()
-        except ProductSize.DoesNotExist:
-            cart_item["size_display"] = size
-        
-    cart["items"].append(cart_item)
-    save_cart(request.session, cart)
-    return JsonResponse({"ok": True, "cart": cart})
-
-def remove_from_cart(request):
-    product_id = int(request.POST['product_id'])
-    size = request.POST.get('size', '')  # Get size if provided
-    cart = get_cart(request.session)
+    # Hold the units for this cart so checkout cannot fail on them later
+    if size and holds_enabled():
+        await amaybe_release_expired_holds()
+        if not await sync_to_async(place_hold)(cart.ensure_token(), product_id, size, qty):
+            available = await stock_index.astock(product_id, size) or 0
+            return JsonResponse({"ok": False, "error": f"Only {available} items available in size {size}"})
+
+    cart.add(product_id, qty, unit_price, size)
 
-    # Create the same cart item key used in add_to_cart
-    cart_item_key = f"{product_id}_{size}" if size else str(product_id)
+    save_cart(request, cart)
+    return JsonResponse({"ok": True, "cart": await cart.ato_client()})
 
-    for item in cart['items']:
-        # Check both product_id and size for the item to remove
-        existing_key = f"{item['product_id']}_{item.get('size', '')}" if item.get('size') else str(item['product_id'])
-        if existing_key == cart_item_key:
-            item['qty'] -= 1
-            if item['qty'] <= 0:
-                cart['items'].remove(item)
-            break
+async def remove_from_cart(request):
+    product_id = int(request.POST['product_id'])
+    size = request.POST.get('size', '')  # Get size if provided
+    cart = await aget_cart(request)
+    removed = cart.remove(product_id, size)
+    if removed and size and cart.token and holds_enabled():
+        await sync_to_async(release_hold)(cart.token, product_id, size, removed)
 
-    save_cart(request.session, cart)
-    return JsonResponse({"ok": True, "cart": cart})
+    save_cart(request, cart)
+    return JsonResponse({"ok": True, "cart": await cart.ato_client()})
 
 
+@cache_control(no_cache=True)
+@storefront_condition
 def checkout(request):
-    cart = get_cart(request.session)
-    return render(request, 'store/checkout.html', {"cart": cart})
+    cart = get_cart(request)
+    return render(request, 'store/checkout.html', {"cart": cart.to_client()})
 
 
 def place_order(request):
     if request.method == 'POST':
         try:
             # Get cart from session
-            cart = get_cart(request.session)
+            cart = get_cart(request)
             
             # Validate cart is not empty
-            if not cart or not cart.get('items'):
+            if not cart:
                 messages.error(request, 'Your cart is empty. Please add items before checkout.')
                 return redirect('checkout')
             
@@ -142,80 +187,59 @@ def place_order(request):
             area = request.POST.get('area', '').strip()
             nearest_landmark = request.POST.get('nearest_landmark', '').strip()
             notes = request.POST.get('notes', '').strip()
-            total_amount = int(request.POST.get('total_amount', 0))
             
             # Basic validation
             if not all([first_name, phone, address, area]):
                 messages.error(request, 'Please fill in all required fields.')
                 return redirect('checkout')
             
-            # Create order with transaction to ensure data integrity
-            with transaction.atomic():
+            # Reserve the order number before opening the checkout transaction
+            # so the counter row is never locked for the whole checkout
+            order_number = allocate_order_number()
+
+            def create_order():
                 # Create the main order
                 order = Order.objects.create(
+                    order_number=order_number,
                     first_name=first_name,
                     phone=phone,
                     address=address,
                     area=area,
                     nearest_landmark=nearest_landmark,
-                    total_amount=total_amount,
+                    total_amount=cart.subtotal,
                     notes=notes,
                     status='pending'
                 )
-                
-                # Create order items
-                for item in cart['items']:
-                    product = Products.objects.get(pk=item['product_id'])
-                    
-                    # Handle sized products
-                    if item.get('size'):
-                        # Check and update stock for sized products
-                        product_size = ProductSize.objects.select_for_update().get(
-                            product=product, size=item['size']
-                        )
-                        if product_size.stock_count < item['qty']:
-                            raise Exception(f"Not enough stock for {product.name} in size {item['size']}")
-                        
-                        # Create order item with size
-                        OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            size=item['size'],  # Add size to OrderItem
-                            quantity=item['qty'],
-                            price=int(float(item['unit_price']))
-                        )
-                        
-                        # Reduce stock count
-                        product_size.stock_count -= item['qty']
-                        product_size.save()
-                        
-                    else:
-                        # Handle non-sized products (your existing logic)
-                        OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            quantity=item['qty'],
-                            price=int(float(item['unit_price']))
-                        )
-                        # Keep your existing stock logic for non-sized products
-                        if hasattr(product, 'stock_count'):
-                            product.stock_count -= item['qty']
-                            if product.stock_count == 0:
-                                product.in_stock = False
-                            product.save()
-                
-                # Clear the cart after successful order
-                request.session['cart'] = {'items': []}
-                request.session.modified = True
-                
-                # Success message
-                messages.success(request, f'Order #{order.order_number} placed successfully! We will contact you soon.')
-                
-                # Redirect to a success page or home
-                return redirect('order_success', order_number=order.order_number)
-                
+
+                # Create order items and take sized lines out of stock in bulk
+                create_order_items(order, cart.items(), cart_token=cart.token)
+                return order
+
+            # One transaction for the whole order, retried if the database
+            # is briefly locked by another checkout
+            order = atomic_with_retry(create_order)
+
+            # Clear the cart after successful order
+            save_cart(request, Cart())
+
+            # Success message
+            messages.success(request, f'Order #{order.order_number} placed successfully! We will contact you soon.')
+
+            # Redirect to a success page or home
+            return redirect('order_success', order_number=order.order_number)
+
+        except InsufficientStock as e:
+            messages.error(request, str(e))
+            return redirect('checkout')
         except Exception as e:
-            messages.error(request, 'An error occurred while placing your order. Please try again.')
+            # Only lock errors that outlasted the retries are "busy"; a
+            # broken schema or a lost connection is an ordinary failure
+            if is_transient(e):
+                logger.exception("Checkout failed: database busy")
+                messages.error(request, 'We are very busy right now and could not place your order. Please try again in a moment.')
+            else:
+                logger.exception("Checkout failed")
+                messages.error(request, 'An error occurred while placing your order. Please try again.')
             return redirect('checkout')
     
     # If not POST, redirect to checkout
@@ -229,4 +253,22 @@ def order_success(request, order_number):
         return render(request, 'store/order_success.html', {'order': order})
     except Order.DoesNotExist:
         messages.error(request, 'Order not found.')
-        return redirect('home')
\ No newline at end of file
+        return redirect('home')
+
+
+def metrics(request):
+    """
+    Request metrics of this worker in Prometheus text format. Scrapers
+    authenticate with `Authorization: Bearer <METRICS_TOKEN>`; without a
+    token only METRICS_ALLOWED_IPS may read it.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        allowed = constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    if not allowed:
+        raise Http404()
+    response = HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    response['Cache-Control'] = 'no-store'
+    return response